@@ -1,10 +1,54 @@
 # app.py
 import os
-from flask import Flask, render_template, jsonify, send_from_directory
+import threading
+from datetime import datetime
+from flask import Flask, render_template, jsonify, send_from_directory, request, abort, Response, stream_with_context
+
+from story_export import ARCHIVE_FORMATS, iter_archive
+from storage_manager import start_background_cleanup, parse_size
 
 app = Flask(__name__)
 OUTPUT_FOLDER = 'output'
 
+# output 폴더 보관 정책 (환경 변수로 설정, STORAGE_CLEANUP_INTERVAL이 0이면 비활성화)
+def _env_value(name, cast):
+    """환경 변수를 한 번 읽어 변환합니다. 없으면 None, 형식이 잘못되면 시작 시점에 ValueError."""
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return cast(value)
+    except ValueError:
+        raise ValueError(f"환경 변수 {name}의 값이 올바르지 않습니다: {value!r}")
+
+STORAGE_CLEANUP_INTERVAL = _env_value("STORAGE_CLEANUP_INTERVAL", int) or 0
+STORAGE_POLICY = {
+    "max_age_days": _env_value("STORAGE_MAX_AGE_DAYS", float),
+    "max_stories": _env_value("STORAGE_MAX_STORIES", int),
+    "max_bytes": _env_value("STORAGE_MAX_BYTES", parse_size),
+    "compact_png": os.getenv("STORAGE_COMPACT_PNG") == "1",
+    "dedupe": os.getenv("STORAGE_DEDUPE") == "1",
+    "remove_partial": os.getenv("STORAGE_KEEP_PARTIAL") != "1",
+}
+_cleanup_started = False
+_cleanup_lock = threading.Lock()
+
+@app.before_request
+def _start_storage_cleanup():
+    """
+    첫 요청을 받을 때 보관 정책 스레드를 한 번만 시작합니다.
+    (import 시점에 시작하면 debug 리로더의 부모/자식 프로세스가 각각 스레드를 띄우므로,
+    실제로 요청을 처리하는 프로세스에서만 시작)
+    """
+    global _cleanup_started
+    if _cleanup_started or STORAGE_CLEANUP_INTERVAL <= 0:
+        return
+    with _cleanup_lock:
+        if _cleanup_started:
+            return
+        _cleanup_started = True
+    start_background_cleanup(STORAGE_CLEANUP_INTERVAL, OUTPUT_FOLDER, **STORAGE_POLICY)
+
 @app.route('/')
 def index():
     """메인 페이지 렌더링"""
@@ -26,6 +70,52 @@ def serve_output_file(filename):
     """output 폴더의 정적 파일(이미지, 오디오 등)을 서빙"""
     return send_from_directory(OUTPUT_FOLDER, filename)
 
+def _resolve_story_ids(story_ids):
+    """요청된 이야기 id가 output 폴더 바로 아래의 폴더인지 확인합니다. (경로 탈출 방지)"""
+    for story_id in story_ids:
+        if not story_id or os.path.basename(story_id) != story_id or story_id in ('.', '..') \
+                or not os.path.isdir(os.path.join(OUTPUT_FOLDER, story_id)):
+            abort(404, description=f"이야기를 찾을 수 없습니다: {story_id}")
+    return story_ids
+
+def _archive_response(story_ids, download_name):
+    """이야기 폴더들을 임시 파일 없이 zip/tar로 스트리밍하는 응답을 만듭니다. (chunked 전송)"""
+    archive_format = request.args.get('format', 'zip')
+    if archive_format not in ARCHIVE_FORMATS:
+        abort(400, description=f"지원하지 않는 형식입니다: {archive_format}")
+    mimetype, extension = ARCHIVE_FORMATS[archive_format]
+    return Response(
+        stream_with_context(iter_archive(OUTPUT_FOLDER, story_ids, archive_format)),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{download_name}{extension}"'},
+    )
+
+@app.route('/api/stories/<story_id>/export')
+def export_story(story_id):
+    """이야기 폴더 하나를 zip(기본값) 또는 tar(?format=tar)로 내려받기"""
+    return _archive_response(_resolve_story_ids([story_id]), story_id)
+
+@app.route('/api/export')
+def export_stories():
+    """
+    여러 이야기를 하나의 아카이브로 내려받기
+    - ?story=<id>&story=<id>: 지정한 이야기만
+    - ?prefix=story_202509: 이름이 접두사로 시작하는 이야기만
+    - 조건이 없으면 모든 이야기
+    """
+    story_ids = request.args.getlist('story')
+    if not story_ids:
+        prefix = request.args.get('prefix', '')
+        try:
+            story_ids = sorted(d for d in os.listdir(OUTPUT_FOLDER)
+                               if d.startswith(prefix) and os.path.isdir(os.path.join(OUTPUT_FOLDER, d)))
+        except FileNotFoundError:
+            story_ids = []
+        if not story_ids:
+            abort(404, description="내보낼 이야기가 없습니다.")
+    download_name = datetime.now().strftime("stories_%Y%m%d_%H%M%S")
+    return _archive_response(_resolve_story_ids(story_ids), download_name)
+
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
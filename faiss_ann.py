@@ -0,0 +1,202 @@
+# faiss_ann.py
+# -*- coding: utf-8 -*-
+"""
+근사 최근접 이웃(ANN) FAISS 인덱스를 구축/로드하고, 정확(Flat) 인덱스 대비
+recall@k와 검색 지연 시간(p50/p99)을 평가합니다.
+
+ANN 인덱스는 setup_langchain_db.py가 만든 정확 인덱스('index')와 같은 폴더에
+'index_<종류>' 이름으로 저장되며, 문서 저장소와 id 매핑을 정확 인덱스와 공유합니다.
+
+평가 사용 예:
+    python faiss_ann.py --index-type ivf --questions eval_questions.txt --k 5 --nprobe 16
+"""
+import os
+import json
+import math
+import pickle
+import time
+import argparse
+
+import numpy as np
+import faiss
+from dotenv import load_dotenv
+from langchain_community.vectorstores import FAISS
+
+from src.client_pool import ClientPool, PooledEmbeddings
+
+DB_FAISS_PATH = "db/faiss_index"
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq")
+
+# 학습/추가 시 한 번에 꺼내는 벡터 수 (메모리 사용량 제한)
+_ADD_BLOCK_SIZE = 10000
+
+
+def index_name_for(index_type):
+    """인덱스 종류에 해당하는 save_local/load_local용 index_name을 반환합니다."""
+    return "index" if index_type == "flat" else f"index_{index_type}"
+
+
+def _factory_string(index_type, ntotal, dim, nlist=None, hnsw_m=32, pq_m=None, pq_nbits=8):
+    """faiss.index_factory 설명 문자열과 실제로 사용된 파라미터를 만듭니다."""
+    if index_type == "hnsw":
+        return f"HNSW{hnsw_m}", {"hnsw_m": hnsw_m}
+
+    # IVF 계열: 클러스터 수는 기본값으로 4*sqrt(N)을 쓰고, 학습 벡터 수를 넘지 않게 제한
+    if nlist is None:
+        nlist = int(4 * math.sqrt(ntotal))
+    nlist = max(1, min(nlist, ntotal))
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat", {"nlist": nlist}
+
+    if pq_m is None:
+        # 벡터 차원을 나누어떨어지게 하는 가장 큰 서브벡터 수 (최대 64)
+        pq_m = max(m for m in range(1, 65) if dim % m == 0)
+    if dim % pq_m != 0:
+        raise ValueError(f"PQ 서브벡터 수({pq_m})가 벡터 차원({dim})을 나누어떨어지게 하지 않습니다.")
+    if ntotal < 2 ** pq_nbits:
+        raise ValueError(f"PQ 학습에는 최소 {2 ** pq_nbits}개의 벡터가 필요합니다. (현재 {ntotal}개, --pq-nbits를 낮춰보세요)")
+    return f"IVF{nlist},PQ{pq_m}x{pq_nbits}", {"nlist": nlist, "pq_m": pq_m, "pq_nbits": pq_nbits}
+
+
+def build_ann_index(flat_db, index_type, nlist=None, hnsw_m=32, pq_m=None, pq_nbits=8, train_size=100000):
+    """
+    정확 인덱스(LangChain FAISS 객체)에 저장된 벡터로 ANN 인덱스를 학습/구축합니다.
+    벡터는 블록 단위로 꺼내 추가하므로 전체 벡터를 한 번에 메모리에 올리지 않습니다.
+    반환값은 (문서 저장소를 공유하는 LangChain FAISS 객체, 사용된 파라미터 dict)입니다.
+    """
+    if index_type not in INDEX_TYPES or index_type == "flat":
+        raise ValueError(f"지원하지 않는 ANN 인덱스 종류입니다: {index_type}")
+
+    flat_index = flat_db.index
+    ntotal, dim = flat_index.ntotal, flat_index.d
+    description, params = _factory_string(index_type, ntotal, dim, nlist, hnsw_m, pq_m, pq_nbits)
+    ann_index = faiss.index_factory(dim, description, flat_index.metric_type)
+
+    if not ann_index.is_trained:
+        n_train = min(ntotal, train_size)
+        train_ids = np.sort(np.random.default_rng(0).choice(ntotal, n_train, replace=False))
+        train_vectors = np.vstack([flat_index.reconstruct(int(i)) for i in train_ids]).astype("float32")
+        ann_index.train(train_vectors)
+        params["train_size"] = n_train
+
+    # 정확 인덱스와 같은 순서로 벡터를 추가하여 index_to_docstore_id 매핑을 그대로 공유
+    for start in range(0, ntotal, _ADD_BLOCK_SIZE):
+        count = min(_ADD_BLOCK_SIZE, ntotal - start)
+        ann_index.add(flat_index.reconstruct_n(start, count))
+
+    params.update({"index_type": index_type, "factory": description, "ntotal": ntotal, "dim": dim})
+    ann_db = FAISS(
+        embedding_function=flat_db.embedding_function,
+        index=ann_index,
+        docstore=flat_db.docstore,
+        index_to_docstore_id=flat_db.index_to_docstore_id,
+    )
+    return ann_db, params
+
+
+def save_ann_index(ann_db, params, folder_path=DB_FAISS_PATH):
+    """
+    ANN 인덱스와 학습 파라미터(json)를 정확 인덱스와 같은 폴더에 저장합니다.
+    문서 저장소와 id 매핑은 정확 인덱스의 index.pkl을 함께 쓰므로 인덱스 파일만 기록합니다.
+    """
+    index_name = index_name_for(params["index_type"])
+    faiss.write_index(ann_db.index, os.path.join(folder_path, f"{index_name}.faiss"))
+    with open(os.path.join(folder_path, f"{index_name}.json"), "w", encoding="utf-8") as f:
+        json.dump(params, f, ensure_ascii=False, indent=2)
+
+
+def set_search_params(db, nprobe=None, ef_search=None):
+    """검색 시점 파라미터(IVF의 nprobe, HNSW의 efSearch)를 설정합니다. 해당하지 않는 인덱스에는 무시됩니다."""
+    index = db.index
+    if nprobe is not None and faiss.try_extract_index_ivf(index) is not None:
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    if ef_search is not None:
+        hnsw_index = faiss.downcast_index(index)
+        if hasattr(hnsw_index, "hnsw"):
+            hnsw_index.hnsw.efSearch = ef_search
+
+
+def load_faiss_index(embeddings, index_type="flat", folder_path=DB_FAISS_PATH, nprobe=None, ef_search=None):
+    """
+    저장된 FAISS 인덱스를 로드하고 검색 파라미터를 적용합니다.
+    ANN 인덱스는 index_<종류>.faiss만 읽고, 문서 저장소와 id 매핑은 정확 인덱스의 index.pkl에서 가져옵니다.
+    """
+    if index_type == "flat":
+        db = FAISS.load_local(
+            folder_path, embeddings,
+            index_name="index",
+            allow_dangerous_deserialization=True,  # 직접 생성한 로컬 인덱스만 로드
+        )
+    else:
+        # FAISS.save_local이 기록하는 형식: (docstore, index_to_docstore_id)
+        with open(os.path.join(folder_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        db = FAISS(
+            embedding_function=embeddings,
+            index=faiss.read_index(os.path.join(folder_path, f"{index_name_for(index_type)}.faiss")),
+            docstore=docstore,
+            index_to_docstore_id=index_to_docstore_id,
+        )
+    set_search_params(db, nprobe=nprobe, ef_search=ef_search)
+    return db
+
+
+def evaluate(exact_db, ann_db, query_vectors, k=5):
+    """정확 인덱스 대비 recall@k와 질문 1건당 검색 지연 시간(ms)의 p50/p99를 계산합니다."""
+    _, exact_ids = exact_db.index.search(query_vectors, k)
+
+    latencies, hits = [], 0
+    for i in range(len(query_vectors)):
+        start = time.perf_counter()
+        _, ann_ids = ann_db.index.search(query_vectors[i:i + 1], k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        expected = set(exact_ids[i][exact_ids[i] >= 0])
+        hits += len(expected & set(ann_ids[0][ann_ids[0] >= 0]))
+
+    total = sum(min(k, len(set(row[row >= 0]))) for row in exact_ids)
+    return {
+        "queries": len(query_vectors),
+        "recall_at_k": hits / total if total else 0.0,
+        "p50_ms": float(np.percentile(latencies, 50)),
+        "p99_ms": float(np.percentile(latencies, 99)),
+    }
+
+
+def load_questions(path):
+    """한 줄에 질문 하나씩 적힌 평가용 질문 파일을 읽습니다."""
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def main():
+    """held-out 질문 세트로 ANN 인덱스의 recall@k와 지연 시간을 평가합니다."""
+    parser = argparse.ArgumentParser(description="ANN FAISS 인덱스의 recall@k와 검색 지연 시간을 평가합니다.")
+    parser.add_argument("--index-type", choices=INDEX_TYPES[1:], required=True, help="평가할 ANN 인덱스 종류")
+    parser.add_argument("--questions", type=str, required=True, help="한 줄에 질문 하나씩 적힌 평가용 질문 파일")
+    parser.add_argument("--k", type=int, default=5, help="recall@k의 k")
+    parser.add_argument("--nprobe", type=int, default=None, help="IVF 계열 인덱스의 검색 클러스터 수")
+    parser.add_argument("--ef-search", type=int, default=None, help="HNSW 인덱스의 efSearch")
+    args = parser.parse_args()
+
+    load_dotenv()
+    embeddings = PooledEmbeddings(ClientPool.from_env(), model="models/text-embedding-004")
+
+    exact_db = load_faiss_index(embeddings, "flat")
+    ann_db = load_faiss_index(embeddings, args.index_type, nprobe=args.nprobe, ef_search=args.ef_search)
+
+    questions = load_questions(args.questions)
+    if not questions:
+        print(f"오류: '{args.questions}'에 질문이 없습니다.")
+        return
+    print(f"{len(questions)}개의 질문을 임베딩하는 중...")
+    query_vectors = np.array([embeddings.embed_query(q) for q in questions], dtype="float32")
+
+    result = evaluate(exact_db, ann_db, query_vectors, k=args.k)
+    print(f"\n--- '{index_name_for(args.index_type)}' 평가 결과 (nprobe={args.nprobe}, efSearch={args.ef_search}) ---")
+    print(f"질문 수: {result['queries']}")
+    print(f"recall@{args.k}: {result['recall_at_k']:.4f}")
+    print(f"검색 지연 시간 p50: {result['p50_ms']:.3f} ms / p99: {result['p99_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
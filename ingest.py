@@ -0,0 +1,130 @@
+# ingest.py
+# -*- coding: utf-8 -*-
+"""
+corpus 문서를 프로세스 풀에서 읽고 분할한 뒤, 일정 크기의 배치 단위로 흘려보내는
+스트리밍 수집 파이프라인입니다.
+
+DirectoryLoader처럼 모든 파일을 한 번에 메모리에 올리지 않고, 동시에 처리 중인
+파일 수(max_pending)와 배치 크기(batch_size)로 메모리 사용량을 제한합니다.
+메인 프로세스가 한 배치를 임베딩하는 동안 워커 프로세스들은 다음 파일들을
+분할하므로, CPU 작업(분할)과 네트워크 작업(임베딩)이 겹쳐서 진행됩니다.
+"""
+import os
+import glob
+import uuid
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from langchain_core.documents import Document
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+DEFAULT_BATCH_SIZE = 256
+# ParentDocumentRetriever가 자식 조각에서 부모 조각을 찾을 때 쓰는 메타데이터 키
+PARENT_ID_KEY = "doc_id"
+
+# 워커 프로세스마다 한 번만 생성되는 분할기
+_splitters = {}
+
+
+def iter_corpus_files(corpus_path, pattern="*.txt"):
+    """corpus 폴더에서 패턴에 맞는 파일 경로를 하나씩 반환합니다. (DirectoryLoader와 동일하게 하위 폴더는 제외)"""
+    for path in glob.iglob(os.path.join(corpus_path, pattern)):
+        if os.path.isfile(path):
+            yield path
+
+
+def _init_worker(splitter_specs):
+    """워커 프로세스 시작 시 (chunk_size, chunk_overlap) 설정으로 분할기를 만들어 둡니다."""
+    for name, (chunk_size, chunk_overlap) in splitter_specs.items():
+        _splitters[name] = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+
+
+def _load_document(path):
+    """TextLoader와 같은 형태(source 메타데이터 포함)로 파일 하나를 읽습니다."""
+    with open(path, "r", encoding="utf-8") as f:
+        return Document(page_content=f.read(), metadata={"source": path})
+
+
+def _split_flat(path):
+    """파일 하나를 읽어 청크 목록으로 분할합니다. (워커 프로세스에서 실행)"""
+    return _splitters["chunk"].split_documents([_load_document(path)])
+
+
+def _split_parent_child(path):
+    """파일 하나를 부모 조각으로 나누고, 각 부모를 다시 자식 조각으로 나눕니다. (워커 프로세스에서 실행)"""
+    results = []
+    for parent in _splitters["parent"].split_documents([_load_document(path)]):
+        parent_id = str(uuid.uuid4())
+        children = _splitters["child"].split_documents([parent])
+        for child in children:
+            child.metadata[PARENT_ID_KEY] = parent_id
+        results.append((parent_id, parent, children))
+    return results
+
+
+def _stream(executor, fn, paths, max_pending):
+    """동시에 제출된 작업 수를 max_pending 이하로 유지하면서, 완료된 순서대로 결과를 반환합니다."""
+    pending = {}
+    paths = iter(paths)
+    exhausted = False
+    while True:
+        while not exhausted and len(pending) < max_pending:
+            path = next(paths, None)
+            if path is None:
+                exhausted = True
+                break
+            pending[executor.submit(fn, path)] = path
+        if not pending:
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            path = pending.pop(future)
+            try:
+                yield future.result()
+            except Exception as e:
+                print(f"  - '{path}' 처리 중 오류 발생, 건너뜁니다: {e}")
+
+
+def iter_chunk_batches(corpus_path, chunk_size=500, chunk_overlap=50,
+                       batch_size=DEFAULT_BATCH_SIZE, workers=None, max_pending=None, pattern="*.txt"):
+    """
+    corpus 문서를 청크로 분할하여 batch_size개 단위의 리스트로 반환하는 제너레이터입니다.
+    setup_langchain_db.py의 FAISS 인덱스 구축에 사용됩니다.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    specs = {"chunk": (chunk_size, chunk_overlap)}
+
+    batch = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as executor:
+        for chunks in _stream(executor, _split_flat, iter_corpus_files(corpus_path, pattern), max_pending):
+            batch.extend(chunks)
+            while len(batch) >= batch_size:
+                yield batch[:batch_size]
+                batch = batch[batch_size:]
+    if batch:
+        yield batch
+
+
+def iter_parent_child_batches(corpus_path, parent_chunk=(2000, 200), child_chunk=(500, 50),
+                              batch_size=DEFAULT_BATCH_SIZE, workers=None, max_pending=None, pattern="*.txt"):
+    """
+    corpus 문서를 부모/자식 조각으로 분할하여 (부모 목록, 자식 목록) 배치를 반환하는 제너레이터입니다.
+    부모 목록은 docstore.mset()에 바로 넣을 수 있는 (id, Document) 쌍이고,
+    자식 조각의 metadata['doc_id']는 해당 부모의 id를 가리킵니다.
+    배치는 자식 조각이 batch_size개 이상 모이면 부모 단위로 끊어서 반환됩니다.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    specs = {"parent": parent_chunk, "child": child_chunk}
+
+    parents, children = [], []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(specs,)) as executor:
+        for results in _stream(executor, _split_parent_child, iter_corpus_files(corpus_path, pattern), max_pending):
+            for parent_id, parent, parent_children in results:
+                parents.append((parent_id, parent))
+                children.extend(parent_children)
+                if len(children) >= batch_size:
+                    yield parents, children
+                    parents, children = [], []
+    if parents:
+        yield parents, children
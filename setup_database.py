@@ -1,5 +1,13 @@
 import sqlite3
 import os
+import argparse
+
+from src.product_lookup import create_schema, rebuild_search_index, iter_products_file, upsert_products
+
+parser = argparse.ArgumentParser(description="금융 상품 데이터베이스와 검색 인덱스를 설정합니다.")
+parser.add_argument("--import", dest="import_path", type=str, default=None,
+                    help="일괄 upsert할 상품 파일 (name, description 열의 CSV 또는 JSONL)")
+args = parser.parse_args()
 
 # db 폴더가 없으면 생성
 os.makedirs("db", exist_ok=True)
@@ -8,14 +16,8 @@ os.makedirs("db", exist_ok=True)
 conn = sqlite3.connect('db/financial_products.db')
 cursor = conn.cursor()
 
-# 'products' 테이블 생성
-cursor.execute('''
-CREATE TABLE IF NOT EXISTS products (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    name TEXT NOT NULL UNIQUE,
-    description TEXT NOT NULL
-)
-''')
+# 'products' 테이블 및 FTS5(trigram) 검색 인덱스 생성
+create_schema(conn)
 
 # 샘플 데이터
 products_to_insert = [
@@ -31,6 +33,15 @@ products_to_insert = [
 for name, description in products_to_insert:
     cursor.execute("INSERT OR IGNORE INTO products (name, description) VALUES (?, ?)", (name, description))
 
+# 검색 인덱스를 products 테이블 기준으로 다시 구축
+rebuild_search_index(conn)
+conn.commit()
+
+# (선택) CSV/JSONL 파일의 상품을 일괄 upsert (검색 인덱스도 함께 갱신)
+if args.import_path:
+    count = upsert_products(conn, iter_products_file(args.import_path))
+    print(f"'{args.import_path}'에서 {count}개의 상품을 반영했습니다.")
+
 # 변경사항 저장 및 연결 종료
 conn.commit()
 conn.close()
@@ -1,21 +1,13 @@
 import os
+import argparse
 from dotenv import load_dotenv
 
 # LangChain 관련 모듈 임포트
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.storage import InMemoryStore
-from langchain.retrievers import ParentDocumentRetriever
+from langchain.storage import LocalFileStore, create_kv_docstore
 
-# .env 파일에서 환경 변수 로드
-load_dotenv()
-
-# API 키 유효성 검사
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key or api_key == "YOUR_API_KEY_HERE":
-    raise ValueError("GEMINI_API_KEY가 .env 파일에 설정되지 않았거나 유효하지 않습니다.")
+from src.client_pool import ClientPool, PooledEmbeddings, EMBED_BATCH_SIZE
+from ingest import iter_parent_child_batches
 
 CORPUS_PATH = "corpus/"
 DB_VECTOR_PATH = "db/chroma_db"  # 벡터 저장소 (자식 조각)
@@ -23,26 +15,30 @@ DB_DOCSTORE_PATH = "db/docstore" # 원본 문서 저장소 (부모 조각)
 
 def main():
     """'부모-자식' 조각을 생성하여 ParentDocumentRetriever를 위한 데이터베이스를 구축합니다."""
-    
-    # 1. 문서 로드
-    print(f"'{CORPUS_PATH}'에서 문서 로딩 중...")
-    loader = DirectoryLoader(CORPUS_PATH, glob='*.txt', loader_cls=TextLoader, loader_kwargs={'encoding': 'utf-8'})
-    docs = loader.load()
-    if not docs:
-        print("오류: corpus 폴더에 문서가 없습니다.")
-        return
-    print(f"총 {len(docs)}개의 문서를 로드했습니다.")
+    parser = argparse.ArgumentParser(description="corpus 문서로 부모-자식 RAG 데이터베이스를 구축합니다.")
+    parser.add_argument("--workers", type=int, default=None, help="문서 분할에 사용할 프로세스 수 (기본값: CPU 코어 수)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"한 번에 임베딩할 자식 조각 수 (기본값: 키 풀의 전체 동시 요청 수 x {EMBED_BATCH_SIZE})")
+    args = parser.parse_args()
 
-    # 2. 부모-자식 분할기 정의
-    # 부모 분할기 (LLM에게 전달될, 문맥이 풍부한 더 큰 조각)
-    parent_splitter = RecursiveCharacterTextSplitter(chunk_size=2000, chunk_overlap=200)
-    # 자식 분할기 (검색의 정확도를 높이기 위한 더 작은 조각)
-    child_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
+    # .env 파일에서 환경 변수 로드 후 API 키 풀 설정 (GEMINI_API_KEYS 또는 GEMINI_API_KEY, 키가 없으면 ValueError)
+    # 분할 워커 프로세스는 spawn 방식에서 이 모듈을 다시 임포트하므로 main()에서만 생성합니다.
+    load_dotenv()
+    client_pool = ClientPool.from_env()
+    # 배치 하나로 풀의 모든 키를 동시에 쓸 수 있도록 기본 배치 크기를 전체 동시 요청 수에 맞춤
+    batch_size = args.batch_size or client_pool.total_concurrency * EMBED_BATCH_SIZE
 
-    # 3. 임베딩 모델 준비
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=api_key)
+    # 1. 부모-자식 분할 설정 (chunk_size, chunk_overlap)
+    # 부모 조각 (LLM에게 전달될, 문맥이 풍부한 더 큰 조각)
+    parent_chunk = (2000, 200)
+    # 자식 조각 (검색의 정확도를 높이기 위한 더 작은 조각)
+    child_chunk = (500, 50)
 
-    # 4. 벡터 저장소 및 문서 저장소 설정
+    # 2. 임베딩 모델 준비
+    # 임베딩 요청을 여러 키에 분산하여 병렬로 처리
+    embeddings = PooledEmbeddings(client_pool, model="models/text-embedding-004")
+
+    # 3. 벡터 저장소 및 문서 저장소 설정
     # 벡터 저장소: 작은 '자식' 조각들의 벡터를 저장하여 검색에 사용
     vectorstore = Chroma(
         collection_name="split_parents", 
@@ -50,30 +46,32 @@ def main():
         persist_directory=DB_VECTOR_PATH
     )
     # 문서 저장소: 큰 '부모' 조각들의 원본 텍스트를 저장
-    store = InMemoryStore()
+    # 배치마다 디스크에 바로 기록하므로 부모 조각 전체를 메모리에 쌓아 두지 않음
+    os.makedirs(DB_DOCSTORE_PATH, exist_ok=True)
+    store = create_kv_docstore(LocalFileStore(DB_DOCSTORE_PATH))
 
-    # 5. ParentDocumentRetriever 설정 및 데이터 추가
-    retriever = ParentDocumentRetriever(
-        vectorstore=vectorstore,
-        docstore=store,
-        child_splitter=child_splitter,
-        parent_splitter=parent_splitter,
-    )
-    
-    print("문서를 부모/자식 조각으로 분할하고 데이터베이스에 추가하는 중...")
-    # add_documents를 호출하면 내부적으로 알아서 분할, 임베딩, 저장을 모두 수행
-    retriever.add_documents(docs, ids=None)
+    # 4. 분할과 임베딩을 배치 단위로 겹쳐서 진행
+    # ParentDocumentRetriever.add_documents와 같은 형태로 저장합니다:
+    # 자식 조각의 metadata['doc_id']가 docstore에 저장된 부모 조각의 id를 가리킵니다.
+    print(f"'{CORPUS_PATH}'의 문서를 부모/자식 조각으로 분할하고 데이터베이스에 추가하는 중...")
+    total_parents, total_children = 0, 0
+    for parents, children in iter_parent_child_batches(CORPUS_PATH, parent_chunk=parent_chunk, child_chunk=child_chunk,
+                                                       batch_size=batch_size, workers=args.workers):
+        if children:
+            vectorstore.add_documents(children)
+        store.mset(parents)
+        total_parents += len(parents)
+        total_children += len(children)
+        print(f"  - 부모 조각 {total_parents}개 / 자식 조각 {total_children}개 저장 완료")
+
+    if not total_parents:
+        print("오류: corpus 폴더에 문서가 없습니다.")
+        return
     
     # Chroma DB를 디스크에 저장
     print("벡터 데이터베이스를 디스크에 저장 중...")
     vectorstore.persist()
 
-    # InMemoryStore는 직접 파일로 저장해야 함
-    import pickle
-    os.makedirs(DB_DOCSTORE_PATH, exist_ok=True)
-    with open(os.path.join(DB_DOCSTORE_PATH, "docstore.pkl"), "wb") as f:
-        pickle.dump(store, f)
-
     print("\n고급 RAG 데이터베이스 생성이 완료되었습니다.")
     print(f"벡터 저장소: '{DB_VECTOR_PATH}'")
     print(f"문서 저장소: '{DB_DOCSTORE_PATH}'")
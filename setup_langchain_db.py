@@ -1,48 +1,73 @@
 import os
+import argparse
 from dotenv import load_dotenv
 
 # LangChain 관련 모듈 임포트
-from langchain_community.document_loaders import DirectoryLoader, TextLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import FAISS
 
-# .env 파일에서 환경 변수 로드
-load_dotenv()
-
-# API 키 유효성 검사
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key or api_key == "YOUR_API_KEY_HERE":
-    raise ValueError("GEMINI_API_KEY가 .env 파일에 설정되지 않았거나 유효하지 않습니다.")
+from src.client_pool import ClientPool, PooledEmbeddings, EMBED_BATCH_SIZE
+from ingest import iter_chunk_batches
+from faiss_ann import INDEX_TYPES, build_ann_index, save_ann_index, index_name_for
 
 CORPUS_PATH = "corpus/"
 DB_FAISS_PATH = "db/faiss_index"
 
 def main():
-    """corpus 폴더의 문서를 로드, 분할, 임베딩하여 FAISS 벡터 저장소에 저장합니다."""
-    
-    # 1. 문서 로드 (Load)
-    print(f"'{CORPUS_PATH}'에서 문서 로딩 중...")
-    loader = DirectoryLoader(CORPUS_PATH, glob='*.txt', loader_cls=TextLoader, loader_kwargs={'encoding': 'utf-8'})
-    documents = loader.load()
-    if not documents:
+    """corpus 폴더의 문서를 스트리밍으로 분할, 임베딩하여 FAISS 벡터 저장소에 저장합니다."""
+    parser = argparse.ArgumentParser(description="corpus 문서로 FAISS 벡터 저장소를 구축합니다.")
+    parser.add_argument("--workers", type=int, default=None, help="문서 분할에 사용할 프로세스 수 (기본값: CPU 코어 수)")
+    parser.add_argument("--batch-size", type=int, default=None,
+                        help=f"한 번에 임베딩할 청크 수 (기본값: 키 풀의 전체 동시 요청 수 x {EMBED_BATCH_SIZE})")
+    parser.add_argument("--index-type", choices=INDEX_TYPES, default="flat",
+                        help="정확 인덱스(flat) 외에 추가로 구축할 ANN 인덱스 종류")
+    parser.add_argument("--nlist", type=int, default=None, help="IVF 클러스터 수 (기본값: 4*sqrt(청크 수))")
+    parser.add_argument("--hnsw-m", type=int, default=32, help="HNSW 그래프의 노드당 이웃 수(M)")
+    parser.add_argument("--pq-m", type=int, default=None, help="PQ 서브벡터 수 (기본값: 차원을 나누는 최대 64 이하 값)")
+    parser.add_argument("--pq-nbits", type=int, default=8, help="PQ 서브벡터당 비트 수")
+    parser.add_argument("--train-size", type=int, default=100000, help="IVF/PQ 학습에 사용할 최대 벡터 수")
+    args = parser.parse_args()
+
+    # .env 파일에서 환경 변수 로드 후 API 키 풀 설정 (GEMINI_API_KEYS 또는 GEMINI_API_KEY, 키가 없으면 ValueError)
+    # 분할 워커 프로세스는 spawn 방식에서 이 모듈을 다시 임포트하므로 main()에서만 생성합니다.
+    load_dotenv()
+    client_pool = ClientPool.from_env()
+    # 배치 하나로 풀의 모든 키를 동시에 쓸 수 있도록 기본 배치 크기를 전체 동시 요청 수에 맞춤
+    batch_size = args.batch_size or client_pool.total_concurrency * EMBED_BATCH_SIZE
+
+    # 임베딩 요청을 여러 키에 분산하여 병렬로 처리
+    embeddings = PooledEmbeddings(client_pool, model="models/text-embedding-004")
+
+    # 1. 문서 로드/분할(Load & Split)과 임베딩/저장(Store)을 배치 단위로 겹쳐서 진행
+    # 워커 프로세스들이 다음 파일을 분할하는 동안, 현재 배치를 임베딩하여 FAISS 인덱스에 추가합니다.
+    print(f"'{CORPUS_PATH}'의 문서를 분할하고 Google 임베딩 모델로 FAISS 벡터 저장소를 생성합니다...")
+    db = None
+    total_chunks = 0
+    for batch in iter_chunk_batches(CORPUS_PATH, chunk_size=500, chunk_overlap=50,
+                                    batch_size=batch_size, workers=args.workers):
+        if db is None:
+            db = FAISS.from_documents(batch, embeddings)
+        else:
+            db.add_documents(batch)
+        total_chunks += len(batch)
+        print(f"  - {total_chunks}개 청크 임베딩 완료")
+
+    if db is None:
         print("오류: corpus 폴더에 문서가 없습니다.")
         return
-    print(f"총 {len(documents)}개의 문서를 로드했습니다.")
-
-    # 2. 문서 분할 (Split)
-    print("문서를 청크(Chunk) 단위로 분할 중...")
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-    docs = text_splitter.split_documents(documents)
-    print(f"총 {len(docs)}개의 청크로 분할되었습니다.")
+    print(f"총 {total_chunks}개의 청크로 분할되었습니다.")
 
-    # 3. 임베딩 및 벡터 저장소 생성 (Store)
-    print("Google 임베딩 모델을 사용하여 문서를 임베딩하고 FAISS 벡터 저장소를 생성합니다...")
-    embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=api_key)
-    
-    # FAISS 벡터 저장소 생성 및 저장
-    db = FAISS.from_documents(docs, embeddings)
+    # 2. FAISS 벡터 저장소 저장 (정확 인덱스는 ANN 평가의 기준으로도 사용)
     db.save_local(DB_FAISS_PATH)
+
+    # 3. (선택) 정확 인덱스의 벡터로 ANN 인덱스를 학습/구축하여 같은 폴더에 저장
+    if args.index_type != "flat":
+        print(f"'{args.index_type}' ANN 인덱스를 학습하고 구축하는 중...")
+        ann_db, params = build_ann_index(
+            db, args.index_type, nlist=args.nlist, hnsw_m=args.hnsw_m,
+            pq_m=args.pq_m, pq_nbits=args.pq_nbits, train_size=args.train_size,
+        )
+        save_ann_index(ann_db, params, DB_FAISS_PATH)
+        print(f"  - '{index_name_for(args.index_type)}' 저장 완료 ({params['factory']})")
     
     print(f"\n벡터 데이터베이스 생성이 완료되었습니다.")
     print(f"'{DB_FAISS_PATH}' 폴더에 인덱스 파일이 저장되었습니다.")
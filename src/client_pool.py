@@ -0,0 +1,214 @@
+# -*- coding: utf-8 -*-
+"""
+여러 Gemini API 키에 요청을 분산하는 클라이언트 풀입니다.
+
+- 키마다 분당 요청 수(RPM)와 동시 요청 수 한도를 둡니다.
+- 각 요청은 사용 가능한 키 중 부하가 가장 적은 키로 보냅니다.
+- 할당량(429/RESOURCE_EXHAUSTED) 오류를 반환한 키는 일정 시간 동안 제외하고 다른 키로 재시도합니다.
+
+환경 변수:
+    GEMINI_API_KEYS         쉼표로 구분한 키 목록 (없으면 GEMINI_API_KEY 하나를 사용)
+    GEMINI_KEY_RPM          키별 분당 요청 수 한도 (값 하나 또는 키 순서대로 쉼표 목록, 생략 시 제한 없음)
+    GEMINI_KEY_CONCURRENCY  키별 동시 요청 수 한도 (값 하나 또는 쉼표 목록, 기본값 4)
+
+ClientPool은 genai.Client처럼 client_pool.models.generate_content(...)로 호출할 수 있고,
+PooledEmbeddings는 LangChain 임베딩 자리에 그대로 넣어 쓸 수 있습니다.
+"""
+import os
+import math
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.embeddings import Embeddings
+
+_RATE_WINDOW_SECONDS = 60.0
+_MAX_EJECT_SECONDS = 600.0
+_QUOTA_MARKERS = ("429", "RESOURCE_EXHAUSTED", "Resource has been exhausted", "quota")
+# 임베딩 요청 1건에 담는 최대 문서 수
+EMBED_BATCH_SIZE = 100
+
+
+def is_quota_error(error):
+    """할당량 초과(429) 오류인지 판정합니다."""
+    if getattr(error, "code", None) == 429:
+        return True
+    message = str(error)
+    return any(marker in message for marker in _QUOTA_MARKERS)
+
+
+class _KeySlot:
+    """API 키 하나의 상태 (동시 요청 수, 최근 요청 시각, 제외 기한)."""
+
+    def __init__(self, key, rpm, concurrency):
+        self.key = key
+        self.rpm = rpm
+        self.concurrency = concurrency
+        self.in_flight = 0
+        self.recent = deque()       # 최근 _RATE_WINDOW_SECONDS 동안의 요청 시각
+        self.ejected_until = 0.0
+        self.failures = 0           # 연속 할당량 오류 횟수 (제외 시간을 지수적으로 늘림)
+        self._client = None
+
+    @property
+    def client(self):
+        """이 키로 만든 genai.Client (처음 사용할 때 생성)."""
+        if self._client is None:
+            from google import genai
+            self._client = genai.Client(api_key=self.key)
+        return self._client
+
+    def _prune(self, now):
+        while self.recent and now - self.recent[0] >= _RATE_WINDOW_SECONDS:
+            self.recent.popleft()
+
+    def available(self, now):
+        self._prune(now)
+        return (now >= self.ejected_until
+                and self.in_flight < self.concurrency
+                and (self.rpm is None or len(self.recent) < self.rpm))
+
+    def next_ready(self, now):
+        """이 키가 다시 사용 가능해지는 시각. 다른 요청이 끝나기를 기다려야 하면 None."""
+        if now < self.ejected_until:
+            return self.ejected_until
+        if self.rpm is not None and len(self.recent) >= self.rpm:
+            return self.recent[0] + _RATE_WINDOW_SECONDS
+        return None
+
+    def load(self):
+        return (self.in_flight / self.concurrency, len(self.recent))
+
+
+class _Models:
+    """genai.Client.models와 같은 형태로 풀을 통해 호출하는 래퍼."""
+
+    def __init__(self, pool):
+        self._pool = pool
+
+    def generate_content(self, **kwargs):
+        return self._pool.call(lambda slot: slot.client.models.generate_content(**kwargs))
+
+
+class ClientPool:
+    """여러 API 키에 대한 부하 분산 클라이언트 풀."""
+
+    def __init__(self, keys, rpm=None, concurrency=4, eject_seconds=30.0):
+        if not keys:
+            raise ValueError("ClientPool에는 최소 한 개의 API 키가 필요합니다.")
+        rpms = rpm if isinstance(rpm, (list, tuple)) else [rpm] * len(keys)
+        concurrencies = concurrency if isinstance(concurrency, (list, tuple)) else [concurrency] * len(keys)
+        if len(rpms) != len(keys) or len(concurrencies) != len(keys):
+            raise ValueError("키별 RPM/동시 요청 수 목록의 길이가 키 개수와 다릅니다.")
+        self._slots = [_KeySlot(k, r, c) for k, r, c in zip(keys, rpms, concurrencies)]
+        self._eject_seconds = eject_seconds
+        self._cond = threading.Condition()
+        self.models = _Models(self)
+
+    @classmethod
+    def from_env(cls):
+        """환경 변수(GEMINI_API_KEYS 또는 GEMINI_API_KEY)로 풀을 만듭니다."""
+        keys = [k.strip() for k in (os.getenv("GEMINI_API_KEYS") or os.getenv("GEMINI_API_KEY") or "").split(",")]
+        keys = [k for k in keys if k and k != "YOUR_API_KEY_HERE"]
+        if not keys:
+            raise ValueError("GEMINI_API_KEYS 또는 GEMINI_API_KEY가 .env 파일에 설정되지 않았거나 유효하지 않습니다.")
+
+        def per_key(name, default, cast):
+            values = [v.strip() for v in os.getenv(name, "").split(",") if v.strip()]
+            if not values:
+                return default
+            if len(values) == 1:
+                return cast(values[0])
+            return [cast(v) for v in values]
+
+        return cls(keys, rpm=per_key("GEMINI_KEY_RPM", None, int), concurrency=per_key("GEMINI_KEY_CONCURRENCY", 4, int))
+
+    @property
+    def size(self):
+        return len(self._slots)
+
+    @property
+    def total_concurrency(self):
+        return sum(slot.concurrency for slot in self._slots)
+
+    def _acquire(self):
+        """사용 가능한 키 중 부하가 가장 적은 키를 예약합니다. 없으면 사용 가능해질 때까지 기다립니다."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                ready = [slot for slot in self._slots if slot.available(now)]
+                if ready:
+                    slot = min(ready, key=_KeySlot.load)
+                    slot.in_flight += 1
+                    slot.recent.append(now)
+                    return slot
+                wakeups = [t for t in (slot.next_ready(now) for slot in self._slots) if t is not None]
+                self._cond.wait(timeout=max(0.01, min(wakeups) - now) if wakeups else None)
+
+    def _release(self, slot, error=None):
+        with self._cond:
+            slot.in_flight -= 1
+            if error is not None and is_quota_error(error):
+                slot.failures += 1
+                eject = min(self._eject_seconds * 2 ** (slot.failures - 1), _MAX_EJECT_SECONDS)
+                slot.ejected_until = time.monotonic() + eject
+                print(f"  - API 키 ...{slot.key[-4:]} 할당량 초과, {eject:.0f}초 동안 제외합니다.")
+            elif error is None:
+                slot.failures = 0
+            self._cond.notify_all()
+
+    def call(self, fn):
+        """
+        fn(slot)을 부하가 가장 적은 키로 실행합니다. slot.client(genai.Client)와 slot.key를 사용할 수 있습니다.
+        할당량 오류가 나면 해당 키를 제외하고, 키 개수만큼 다른 키로 재시도합니다.
+        """
+        for attempt in range(len(self._slots)):
+            slot = self._acquire()
+            try:
+                result = fn(slot)
+            except Exception as e:
+                self._release(slot, e)
+                if not is_quota_error(e) or attempt == len(self._slots) - 1:
+                    raise
+                continue
+            self._release(slot)
+            return result
+
+
+class PooledEmbeddings(Embeddings):
+    """
+    GoogleGenerativeAIEmbeddings를 키마다 하나씩 두고 ClientPool로 요청을 분산하는 LangChain 임베딩입니다.
+    embed_documents는 문서를 풀의 전체 동시 요청 수만큼(요청당 최대 batch_size개) 나누어 병렬로 임베딩하므로,
+    키를 추가하면 한 번에 처리하는 요청 수도 늘어납니다.
+    """
+
+    def __init__(self, pool, model="models/text-embedding-004", batch_size=EMBED_BATCH_SIZE):
+        self._pool = pool
+        self._model = model
+        self._batch_size = batch_size
+        self._by_key = {}
+        self._lock = threading.Lock()
+
+    def _embeddings_for(self, slot):
+        with self._lock:
+            if slot.key not in self._by_key:
+                from langchain_google_genai import GoogleGenerativeAIEmbeddings
+                self._by_key[slot.key] = GoogleGenerativeAIEmbeddings(model=self._model, google_api_key=slot.key)
+            return self._by_key[slot.key]
+
+    def embed_documents(self, texts):
+        # 요청 수가 풀의 전체 동시 요청 수 이상이 되도록 나눔 (요청당 최대 batch_size개)
+        size = max(1, min(self._batch_size, math.ceil(len(texts) / self._pool.total_concurrency)))
+        batches = [texts[i:i + size] for i in range(0, len(texts), size)]
+        if len(batches) <= 1:
+            return self._pool.call(lambda slot: self._embeddings_for(slot).embed_documents(texts))
+        with ThreadPoolExecutor(max_workers=min(len(batches), self._pool.total_concurrency)) as executor:
+            results = executor.map(
+                lambda batch: self._pool.call(lambda slot: self._embeddings_for(slot).embed_documents(batch)),
+                batches,
+            )
+            return [vector for batch_vectors in results for vector in batch_vectors]
+
+    def embed_query(self, text):
+        return self._pool.call(lambda slot: self._embeddings_for(slot).embed_query(text))
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+이미지 생성 요청의 꼬리 지연(tail latency)을 줄이기 위한 헤지(hedged) 요청 정책입니다.
+
+요청이 최근 관측한 지연 시간의 지정 백분위수(예: p95) 안에 돌아오지 않으면 같은 요청을
+하나 더 보내고, 먼저 성공한 결과를 사용합니다. 늦은 쪽은 아직 시작 전이면 취소하고,
+이미 실행 중이면 결과를 버립니다. 추가 요청 수는 전체 요청 대비 비율(budget)로 제한합니다.
+
+관측한 지연 시간은 상태 파일에 저장하여 다음 실행에서도 이어서 사용합니다.
+"""
+import os
+import json
+import time
+import threading
+from collections import deque
+from concurrent.futures import Future, FIRST_COMPLETED, wait
+
+import numpy as np
+
+DEFAULT_STATE_PATH = os.path.join("db", "hedge_latency.json")  # 공개 서빙되는 output 폴더 밖의 상태 파일
+
+
+class HedgePolicy:
+    """최근 지연 시간을 기록하고, 헤지 시점과 예산을 결정하며, 결과 통계를 보고합니다."""
+
+    def __init__(self, percentile=95, budget=0.2, window=50, min_samples=3, initial_delay=20.0,
+                 state_path=DEFAULT_STATE_PATH):
+        self.percentile = percentile
+        self.budget = budget                # 전체 요청 대비 추가(헤지) 요청의 최대 비율
+        self.min_samples = min_samples      # 이보다 관측치가 적으면 initial_delay를 사용
+        self.initial_delay = initial_delay
+        self.state_path = state_path
+        self._latencies = deque(self._load_state(), maxlen=window)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        self._primary_latencies = []    # 헤지가 없었다면 기다렸을 시간 (1차 요청의 완료 시간)
+        self._pending_primaries = {}    # 아직 끝나지 않은 1차 요청 -> 시작 시각
+        self._effective_latencies = []  # 실제로 기다린 시간
+
+    def _load_state(self):
+        """이전 실행에서 저장한 지연 시간 목록을 읽습니다. 없거나 읽을 수 없으면 빈 목록입니다."""
+        if not self.state_path:
+            return []
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return [float(x) for x in json.load(f)]
+        except (OSError, ValueError, TypeError):
+            return []
+
+    def close(self):
+        """관측한 지연 시간을 상태 파일에 저장합니다. 실행 중인 (버려진) 요청은 기다리지 않습니다."""
+        if not self.state_path:
+            return
+        with self._lock:
+            latencies = list(self._latencies)
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            with open(self.state_path, "w", encoding="utf-8") as f:
+                json.dump(latencies, f)
+        except OSError as e:
+            print(f"  - 헤지 지연 시간 기록 저장 실패: {e}")
+
+    def hedge_delay(self):
+        """1차 요청 후 헤지 요청을 보내기까지 기다릴 시간(초)을 반환합니다."""
+        with self._lock:
+            if len(self._latencies) < self.min_samples:
+                return self.initial_delay
+            return float(np.percentile(self._latencies, self.percentile))
+
+    def _record(self, latency):
+        with self._lock:
+            self._latencies.append(latency)
+
+    def _submit(self, fn, accept):
+        """
+        요청을 데몬 스레드에서 실행하고 (결과, 성공 여부, 지연 시간)을 담을 future를 반환합니다.
+        버려진 요청이 끝날 때까지 인터프리터 종료가 지연되지 않도록 데몬 스레드를 사용합니다.
+        """
+        future = Future()
+
+        def run():
+            if not future.set_running_or_notify_cancel():
+                return
+            start = time.perf_counter()
+            try:
+                result = fn()
+                latency = time.perf_counter() - start
+                ok = accept(result)
+                if ok:
+                    self._record(latency)
+                future.set_result((result, ok, latency))
+            except BaseException as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, name="hedge", daemon=True).start()
+        return future
+
+    def call(self, fn, accept=lambda result: result is not None):
+        """
+        fn()을 헤지 정책에 따라 실행합니다. accept(result)가 참인 결과를 먼저 얻은 쪽을 반환합니다.
+        두 요청 모두 실패하면 마지막 예외를 다시 발생시키거나, 마지막으로 받은 결과를 그대로 반환합니다.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            self.calls += 1
+        primary = self._submit(fn, accept)
+        with self._lock:
+            self._pending_primaries[primary] = start
+
+        def record_primary(future):
+            # 헤지에 져서 결과가 버려진 1차 요청도 "헤지가 없었다면" 기준으로 기록
+            latency = future.result()[2] if not future.exception() else time.perf_counter() - start
+            with self._lock:
+                self._pending_primaries.pop(future, None)
+                self._primary_latencies.append(latency)
+        primary.add_done_callback(record_primary)
+        pending = {primary}
+
+        done, _ = wait(pending, timeout=self.hedge_delay())
+        if not done:
+            with self._lock:
+                allowed = self.hedges < self.budget * self.calls
+                if allowed:
+                    self.hedges += 1
+            if allowed:
+                pending.add(self._submit(fn, accept))
+
+        last_result, last_error = None, None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                try:
+                    result, ok, _ = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                last_result = result
+                if ok:
+                    for loser in pending:
+                        loser.cancel()  # 실행 중이면 취소되지 않으며, 결과는 버려짐
+                    with self._lock:
+                        if future is not primary:
+                            self.hedge_wins += 1
+                        self._effective_latencies.append(time.perf_counter() - start)
+                    return result
+        with self._lock:
+            self._effective_latencies.append(time.perf_counter() - start)
+        if last_result is None and last_error is not None:
+            raise last_error
+        return last_result
+
+    def report(self):
+        """헤지 비율과 p99 지연 시간 개선 정도를 출력합니다."""
+        if not self.calls:
+            return
+        print(f"\n--- 헤지 요청 통계 (p{self.percentile} 기준, 예산 {self.budget:.0%}) ---")
+        print(f"요청 수: {self.calls}, 헤지 요청 수: {self.hedges} ({self.hedges / self.calls:.1%}), 헤지 승리: {self.hedge_wins}")
+        now = time.perf_counter()
+        with self._lock:
+            # 아직 끝나지 않은 1차 요청은 지금까지 걸린 시간을 하한값으로 포함
+            primary = list(self._primary_latencies) + [now - s for s in self._pending_primaries.values()]
+            effective = list(self._effective_latencies)
+        if primary and effective:
+            p99_primary = float(np.percentile(primary, 99))
+            p99_effective = float(np.percentile(effective, 99))
+            print(f"p99 지연 시간: 헤지 없음 {p99_primary:.2f}초 이상 -> 헤지 적용 {p99_effective:.2f}초 "
+                  f"({p99_primary - p99_effective:+.2f}초 이상 개선)")
@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 
-import sqlite3
 import os
 import io
 import time
@@ -8,36 +7,23 @@ import re
 from dotenv import load_dotenv
 from datetime import datetime # datetime 모듈 추가
 
-from google import genai
 from google.genai import types
 
 from gtts import gTTS
 from PIL import Image
+from narration import generate_narration, split_scenes
+from hedging import HedgePolicy
+from client_pool import ClientPool
 import argparse
+
+# 금융 상품 DB 조회 (공유 읽기 전용 연결, 설명 캐시, 유사 이름 매칭)
+from product_lookup import get_product_description, resolve_product_name, find_product_candidates, search_products
+
 # .env 파일에서 환경 변수 로드
 load_dotenv()
 
-# Gemini API 키 설정
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key or api_key == "YOUR_API_KEY_HERE":
-    raise ValueError("GEMINI_API_KEY가 .env 파일에 설정되지 않았거나 유효하지 않습니다. .env 파일을 확인해주세요.")
-
-# --- 1. 데이터베이스 연결 및 정보 검색 ---
-def get_product_description(product_name):
-    """데이터베이스에서 금융 상품의 설명을 가져옵니다."""
-    script_dir = os.path.dirname(os.path.abspath(__file__))
-    project_root = os.path.dirname(script_dir)
-    db_path = os.path.join(project_root, 'db', 'financial_products.db')
-
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    cursor.execute("SELECT description FROM products WHERE name = ?", (product_name,))
-    result = cursor.fetchone()
-    conn.close()
-    if result:
-        return result[0]
-    else:
-        return None
+# Gemini API 키 풀 설정 (GEMINI_API_KEYS 또는 GEMINI_API_KEY, 키가 없으면 ValueError)
+client_pool = ClientPool.from_env()
 
 # --- 2. 첫 번째 프롬프팅: 스토리라인 생성 ---
 def generate_storyline(client, product_name, description):
@@ -85,8 +71,12 @@ def parse_storyline(storyline_text):
 
 
 # --- 3. 두 번째 프롬프팅: 일러스트 생성 (표지 참조 파이프라인) ---
-def generate_illustrations(client, scenes_text, character_description, output_dir):
-    """표지 이미지를 생성하고, 이를 참조하여 각 장면의 일러스트를 생성합니다."""
+def _has_image(response):
+    """이미지 생성 응답에 이미지 데이터가 들어 있는지 확인합니다. (헤지 요청의 성공 판정)"""
+    return bool(response.candidates) and any(part.inline_data for part in response.candidates[0].content.parts)
+
+def generate_illustrations(client, scenes_text, character_description, output_dir, hedge=None):
+    """표지 이미지를 생성하고, 이를 참조하여 각 장면의 일러스트를 생성합니다. (hedge: 표지/장면 이미지 요청에 적용할 HedgePolicy)"""
     print("\n일러스트 생성 중... (Gemini Image Preview API 호출)")
 
     if not character_description:
@@ -105,11 +95,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
     for attempt in range(3):
         try:
             generate_content_config = types.GenerateContentConfig(response_modalities=["IMAGE"])
-            response = client.models.generate_content(
+            request = lambda: client.models.generate_content(
                 model="gemini-2.5-flash-image-preview",
                 contents=[cover_prompt],
                 config=generate_content_config,
             )
+            response = hedge.call(request, accept=_has_image) if hedge else request()
             if response.candidates:
                 for part in response.candidates[0].content.parts:
                     if part.inline_data:
@@ -132,15 +123,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
         return
 
     # 2. 장면별 일러스트 생성
-    scenes = [s.strip() for s in scenes_text.strip().split('장면') if s and ':' in s]
+    scenes = split_scenes(scenes_text)
 
-    for i, scene_text in enumerate(scenes):
+    for i, clean_text in enumerate(scenes):
         scene_number = i + 1
         print(f"  - 장면 {scene_number} 이미지 생성 중...")
 
-        clean_text = scene_text.split(":", 1)[1].strip() if ":" in scene_text else scene_text
-        clean_text = clean_text.replace('**', '')
-
         scene_prompt = f"""
         Reference the characters and art style from the provided cover image.
         
@@ -156,11 +144,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
         for attempt in range(3):
             try:
                 generate_content_config = types.GenerateContentConfig(response_modalities=["IMAGE"])
-                response = client.models.generate_content(
+                request = lambda: client.models.generate_content(
                     model="gemini-2.5-flash-image-preview",
                     contents=contents_for_api,
                     config=generate_content_config,
                 )
+                response = hedge.call(request, accept=_has_image) if hedge else request()
                 if response.candidates:
                     for part in response.candidates[0].content.parts:
                         if part.inline_data:
@@ -179,9 +168,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
 
         if not image_generated:
             print(f"  - 장면 {scene_number} 이미지 생성에 최종적으로 실패했습니다.")
-            with open(f"output/scene_{scene_number}_error.txt", "w", encoding="utf-8") as f:
+            with open(os.path.join(output_dir, f"scene_{scene_number}_error.txt"), "w", encoding="utf-8") as f:
                 f.write("최대 재시도 횟수 초과")
 
+    if hedge:
+        hedge.report()
+
     print("\n'output' 폴더에 일러스트 파일 생성이 완료되었습니다.")
 
 
@@ -190,15 +182,13 @@ def generate_voice_and_subtitles(scenes_text, output_dir):
     """gTTS를 사용하여 음성 파일을 생성하고, 자막 파일을 만듭니다."""
     print("\n음성 및 자막 생성 중...")
     
-    scenes = [s.strip() for s in scenes_text.strip().split('장면') if s and ':' in s]
+    scenes = split_scenes(scenes_text)
     if not scenes:
         print("  - 스토리라인에서 장면을 추출할 수 없습니다.")
         return
 
-    for i, scene_text in enumerate(scenes):
+    for i, clean_text in enumerate(scenes):
         scene_number = i + 1
-        clean_text = scene_text.split(":", 1)[1].strip() if ":" in scene_text else scene_text
-        clean_text = clean_text.replace('**', '')
 
         print(f"  - 장면 {scene_number} 음성/자막 생성 중...")
 
@@ -207,7 +197,7 @@ def generate_voice_and_subtitles(scenes_text, output_dir):
             tts.save(os.path.join(output_dir, f"scene_{scene_number}_audio.mp3"))
         except Exception as e:
             print(f"  - 장면 {scene_number} 음성 생성 중 오류 발생: {e}")
-            with open(f"output/scene_{scene_number}_audio_placeholder.txt", "w", encoding="utf-8") as f:
+            with open(os.path.join(output_dir, f"scene_{scene_number}_audio_placeholder.txt"), "w", encoding="utf-8") as f:
                 f.write(f"음성 생성 오류: {clean_text}")
 
         with open(os.path.join(output_dir, f"scene_{scene_number}_subtitle.txt"), "w", encoding="utf-8") as f:
@@ -222,17 +212,38 @@ def main():
 
     parser = argparse.ArgumentParser(description="금융 상품 설명 동화를 생성합니다.")
     parser.add_argument("--product", type=str, required=True, help="설명을 생성할 금융 상품의 이름")
+    parser.add_argument("--narration", action="store_true", help="장면 음성을 동시에 합성하여 단일 오디오와 WebVTT 자막으로 생성")
+    parser.add_argument("--hedge", action="store_true", help="느린 이미지 요청에 중복(헤지) 요청을 보내 꼬리 지연을 줄임")
+    parser.add_argument("--hedge-percentile", type=float, default=95, help="헤지 요청을 보낼 지연 시간 백분위수")
+    parser.add_argument("--hedge-budget", type=float, default=0.2, help="전체 요청 대비 헤지 요청의 최대 비율")
     args = parser.parse_args()
     
-    client = genai.Client(api_key=api_key)
+    # 텍스트/이미지 요청을 부하가 가장 적은 키로 분산 (genai.Client와 같은 방식으로 호출)
+    client = client_pool
 
     product_to_explain = args.product
     print(f"--- '{product_to_explain}' 설명 프로세스 시작 ---")
 
-    description = get_product_description(product_to_explain)
-    if not description:
+    product_name = resolve_product_name(product_to_explain)
+    if not product_name:
         print(f"오류: '{product_to_explain}'에 대한 정보를 DB에서 찾을 수 없습니다.")
+        candidates = find_product_candidates(product_to_explain)
+        if candidates:
+            print("혹시 다음 상품을 찾으셨나요?")
+            for name, score in candidates:
+                print(f"  - {name} (유사도 {score:.2f})")
+        # 이름이 비슷하지 않아도 설명에 입력한 문구가 들어 있는 상품 안내
+        suggested = {name for name, _ in candidates}
+        related = [name for name in search_products(product_to_explain) if name not in suggested]
+        if related:
+            print("설명에 관련 내용이 있는 상품:")
+            for name in related:
+                print(f"  - {name}")
         return
+    if product_name != product_to_explain:
+        print(f"'{product_to_explain}' -> DB 상품 '{product_name}'(으)로 조회합니다.")
+        product_to_explain = product_name
+    description = get_product_description(product_to_explain)
 
     full_storyline_text = generate_storyline(client, product_to_explain, description)
     if not full_storyline_text:
@@ -255,9 +266,15 @@ def main():
 
     character_description, scenes_text = parse_storyline(full_storyline_text)
 
-    generate_illustrations(client, scenes_text, character_description, output_dir)
+    hedge = HedgePolicy(percentile=args.hedge_percentile, budget=args.hedge_budget) if args.hedge else None
+    generate_illustrations(client, scenes_text, character_description, output_dir, hedge=hedge)
+    if hedge:
+        hedge.close()  # 관측한 지연 시간을 다음 실행을 위해 저장
     
-    generate_voice_and_subtitles(scenes_text, output_dir)
+    if args.narration:
+        generate_narration(scenes_text, output_dir)
+    else:
+        generate_voice_and_subtitles(scenes_text, output_dir)
 
     print("\n--- 모든 프로세스 완료 ---")
     print("'output' 폴더에서 결과물을 확인하세요.")
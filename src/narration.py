@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+이야기 전체를 하나의 오디오 스트림으로 만드는 내레이션 모드입니다.
+
+- 장면별 음성을 gTTS로 동시에 합성합니다. (scene_N_audio.mp3)
+- 장면 음성을 이어 붙여 이야기 단위 오디오 파일 하나를 만듭니다. (story_audio.mp3)
+- 측정한 장면별 재생 시간으로 큐 시간을 계산한 WebVTT 자막을 만듭니다. (story_subtitles.vtt)
+
+뷰어는 story_audio.mp3 하나를 HTTP Range 요청으로 탐색하면서 장면을 전환합니다.
+"""
+import os
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+from gtts import gTTS
+
+STORY_AUDIO_FILENAME = "story_audio.mp3"
+STORY_SUBTITLE_FILENAME = "story_subtitles.vtt"
+
+# MPEG Audio Layer III 프레임 헤더 테이블 (kbps / Hz)
+_BITRATES = {
+    1: [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    2: [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+_SAMPLE_RATES = {
+    1: [44100, 48000, 32000],
+    2: [22050, 24000, 16000],
+    2.5: [11025, 12000, 8000],
+}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}
+
+
+def _strip_id3(data):
+    """MP3 데이터 앞의 ID3v2 태그를 제거하고 오디오 프레임만 반환합니다."""
+    if len(data) >= 10 and data[:3] == b"ID3":
+        size = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9]
+        return data[10 + size:]
+    return data
+
+
+def mp3_duration(data):
+    """MP3(Layer III) 프레임 헤더를 읽어 재생 시간(초)을 계산합니다."""
+    data = _strip_id3(data)
+    pos, duration = 0, 0.0
+    while pos + 4 <= len(data):
+        b1, b2 = data[pos + 1], data[pos + 2]
+        version = _VERSIONS.get((b1 >> 3) & 0x3)
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 0x3
+        if (data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version is None or ((b1 >> 1) & 0x3) != 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            # 프레임 동기 신호가 아니면 한 바이트씩 넘기며 다음 프레임을 찾음
+            pos += 1
+            continue
+        bitrate = _BITRATES[1 if version == 1 else 2][bitrate_index] * 1000
+        sample_rate = _SAMPLE_RATES[version][rate_index]
+        samples = 1152 if version == 1 else 576
+        frame_length = samples // 8 * bitrate // sample_rate + ((b2 >> 1) & 0x1)
+        duration += samples / sample_rate
+        pos += frame_length
+    return duration
+
+
+def _format_timestamp(seconds):
+    """초를 WebVTT 타임스탬프(HH:MM:SS.mmm)로 변환합니다."""
+    millis = int(round(seconds * 1000))
+    hours, millis = divmod(millis, 3600000)
+    minutes, millis = divmod(millis, 60000)
+    secs, millis = divmod(millis, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}.{millis:03d}"
+
+
+def build_webvtt(cues):
+    """[(장면 번호, 시작 초, 끝 초, 자막), ...]으로 WebVTT 문서를 만듭니다."""
+    lines = ["WEBVTT", ""]
+    for scene_number, start, end, text in cues:
+        lines.append(f"scene-{scene_number}")
+        lines.append(f"{_format_timestamp(start)} --> {_format_timestamp(end)}")
+        # 빈 줄은 큐의 끝을 의미하므로 자막 안의 빈 줄은 제거
+        lines.extend(line for line in text.splitlines() if line.strip())
+        lines.append("")
+    return "\n".join(lines)
+
+
+def split_scenes(scenes_text):
+    """
+    스토리라인의 장면 부분을 '장면 N:' 기준으로 나누어, 장면 순서대로 정리된 본문 목록을 반환합니다.
+    이미지/음성/자막/내레이션이 모두 이 목록의 순서로 scene_N 번호를 매깁니다.
+    """
+    scenes = [s.strip() for s in scenes_text.strip().split('장면') if s and ':' in s]
+    return [scene.split(":", 1)[1].strip().replace('**', '') for scene in scenes]
+
+
+def _synthesize(text):
+    """gTTS로 한 장면의 음성을 합성하여 MP3 바이트로 반환합니다."""
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='ko').write_to_fp(buffer)
+    return buffer.getvalue()
+
+
+def generate_narration(scenes_text, output_dir, max_workers=4):
+    """장면별 음성을 동시에 합성하고, 이야기 단위 오디오와 WebVTT 자막을 생성합니다."""
+    print("\n내레이션(단일 오디오 + WebVTT 자막) 생성 중...")
+
+    texts = split_scenes(scenes_text)
+    if not texts:
+        print("  - 스토리라인에서 장면을 추출할 수 없습니다.")
+        return
+
+    for i, clean_text in enumerate(texts):
+        with open(os.path.join(output_dir, f"scene_{i + 1}_subtitle.txt"), "w", encoding="utf-8") as f:
+            f.write(clean_text)
+
+    # 1. 장면별 음성 동시 합성
+    print(f"  - {len(texts)}개 장면의 음성을 동시에 합성하는 중...")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_synthesize, text) for text in texts]
+
+    # 2. 장면 순서대로 이어 붙이면서 측정한 재생 시간으로 큐 시간 계산
+    cues = []
+    elapsed = 0.0
+    with open(os.path.join(output_dir, STORY_AUDIO_FILENAME), "wb") as story_audio:
+        for i, future in enumerate(futures):
+            scene_number = i + 1
+            try:
+                audio = future.result()
+            except Exception as e:
+                # 실패한 장면은 단일 스트림과 자막에서 제외 (뷰어는 장면별 파일로 대체)
+                print(f"  - 장면 {scene_number} 음성 생성 중 오류 발생: {e}")
+                with open(os.path.join(output_dir, f"scene_{scene_number}_audio_placeholder.txt"), "w", encoding="utf-8") as f:
+                    f.write(f"음성 생성 오류: {texts[i]}")
+                continue
+
+            with open(os.path.join(output_dir, f"scene_{scene_number}_audio.mp3"), "wb") as f:
+                f.write(audio)
+            frames = _strip_id3(audio)
+            duration = mp3_duration(frames)
+            story_audio.write(frames)
+            cues.append((scene_number, elapsed, elapsed + duration, texts[i]))
+            elapsed += duration
+
+    # 3. WebVTT 자막 저장
+    with open(os.path.join(output_dir, STORY_SUBTITLE_FILENAME), "w", encoding="utf-8") as f:
+        f.write(build_webvtt(cues))
+
+    print(f"  - 총 재생 시간 {elapsed:.1f}초, 자막 큐 {len(cues)}개")
+    print(f"\n'{output_dir}' 폴더에 '{STORY_AUDIO_FILENAME}'와 '{STORY_SUBTITLE_FILENAME}'가 생성되었습니다.")
@@ -0,0 +1,241 @@
+# -*- coding: utf-8 -*-
+"""
+금융 상품 DB 조회 계층입니다.
+
+- 프로세스 전체에서 하나의 읽기 전용 SQLite 연결을 재사용합니다.
+- 상품 설명은 LRU 캐시에 보관합니다.
+- 공백/밑줄/기호 차이를 무시하는 정규화 이름 매칭과, FTS5(trigram) 인덱스를 이용한
+  유사 이름 후보 검색을 제공합니다. ("현대카드 제로 에디션" -> "현대카드_제로_에디션")
+- CSV/JSONL 파일에서 수천 개의 상품을 한 번에 넣는 일괄 upsert 경로를 제공합니다.
+"""
+import os
+import re
+import csv
+import json
+import sqlite3
+import difflib
+import threading
+import unicodedata
+from functools import lru_cache
+
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DB_PATH = os.path.join(_project_root, 'db', 'financial_products.db')
+
+# 유사 이름 후보를 자동으로 채택하는 최소 유사도
+MATCH_THRESHOLD = 0.75
+_UPSERT_BATCH_SIZE = 1000
+
+_conn = None
+_conn_lock = threading.Lock()
+_has_fts = False
+_has_name_key = False
+
+
+# --- 1. 스키마 및 검색 인덱스 ---
+def create_schema(conn):
+    """products 테이블(정규화 이름 name_key 포함)과 FTS5(trigram) 검색 인덱스를 생성합니다."""
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS products (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        name TEXT NOT NULL UNIQUE,
+        description TEXT NOT NULL,
+        name_key TEXT
+    )
+    ''')
+    # name_key 열이 없던 기존 DB에 열 추가 (값은 rebuild_search_index에서 채움)
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+    if "name_key" not in columns:
+        conn.execute("ALTER TABLE products ADD COLUMN name_key TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_products_name_key ON products (name_key)")
+    # rowid = products.id, name_key는 정규화된 이름 (공백/밑줄/기호 제거, 소문자)
+    conn.execute('''
+    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+        name, name_key, description,
+        tokenize = 'trigram'
+    )
+    ''')
+
+
+def rebuild_search_index(conn):
+    """products 테이블 전체로 정규화 이름(name_key)과 FTS5 검색 인덱스를 다시 만듭니다."""
+    conn.execute("DELETE FROM products_fts")
+    rows = conn.execute("SELECT id, name, description FROM products").fetchall()
+    conn.executemany("UPDATE products SET name_key = ? WHERE id = ?",
+                     ((normalize_name(name), pid) for pid, name, _ in rows))
+    conn.executemany(
+        "INSERT INTO products_fts (rowid, name, name_key, description) VALUES (?, ?, ?, ?)",
+        ((pid, name, normalize_name(name), description) for pid, name, description in rows),
+    )
+    conn.execute("INSERT INTO products_fts (products_fts) VALUES ('optimize')")
+
+
+def normalize_name(name):
+    """비교용 정규화 이름을 만듭니다. (NFKC, 소문자, 공백/밑줄/기호 제거)"""
+    return re.sub(r'[\W_]+', '', unicodedata.normalize('NFKC', name).lower())
+
+
+# --- 2. 읽기 전용 연결 ---
+def _get_connection():
+    """프로세스 전체에서 공유하는 읽기 전용 연결을 반환합니다. (처음 호출 시 생성)"""
+    global _conn, _has_fts, _has_name_key
+    if _conn is not None:
+        return _conn
+    with _conn_lock:
+        # 여러 스레드가 동시에 처음 호출해도 연결은 하나만 생성
+        if _conn is None:
+            conn = sqlite3.connect(f"file:{DB_PATH}?mode=ro", uri=True, check_same_thread=False)
+            _has_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+            ).fetchone() is not None
+            _has_name_key = "name_key" in [row[1] for row in conn.execute("PRAGMA table_info(products)")]
+            if not (_has_fts and _has_name_key):
+                print("  - 경고: 검색 인덱스(name_key/products_fts)가 없어 유사 이름 검색을 사용할 수 없습니다. setup_database.py를 다시 실행해주세요.")
+            _conn = conn
+    return _conn
+
+
+def _query(sql, params=()):
+    """공유 연결에서 쿼리를 실행하고 모든 결과 행을 반환합니다."""
+    conn = _get_connection()
+    with _conn_lock:
+        return conn.execute(sql, params).fetchall()
+
+
+# --- 3. 조회 ---
+@lru_cache(maxsize=1024)
+def get_product_description(product_name):
+    """데이터베이스에서 금융 상품의 설명을 가져옵니다. (정확히 일치하는 이름만, 결과는 캐시됨)"""
+    rows = _query("SELECT description FROM products WHERE name = ?", (product_name,))
+    return rows[0][0] if rows else None
+
+
+def _candidate_rows(key, limit):
+    """정규화 이름으로 후보 (이름, name_key) 행을 가져옵니다. (trigram 검색 결과가 없으면 products를 직접 검색)"""
+    if len(key) < 3:
+        # trigram 인덱스는 3글자 미만을 검색할 수 없으므로 products의 name_key를 부분 문자열로 검색
+        # (정규화 이름에는 LIKE 특수문자인 '%', '_'가 남아 있지 않음)
+        return _query(
+            "SELECT name, name_key FROM products WHERE name_key LIKE ? LIMIT ?",
+            ('%' + key + '%', limit),
+        )
+    rows = []
+    if _has_fts:
+        trigrams = {key[i:i + 3] for i in range(len(key) - 2)}
+        match = "name_key : (" + " OR ".join(f'"{t}"' for t in trigrams) + ")"
+        rows = _query(
+            "SELECT name, name_key FROM products_fts WHERE products_fts MATCH ? ORDER BY bm25(products_fts) LIMIT ?",
+            (match, limit),
+        )
+    if rows:
+        return rows
+    # trigram이 겹치는 상품이 없으면 products를 직접 검색:
+    # 질문에 포함된 짧은(3글자 미만) 상품 이름("주식 상품" -> 주식)과, 두 글자 조각이 겹치는 이름
+    bigrams = sorted({key[i:i + 2] for i in range(len(key) - 1)})
+    conditions = ["(length(name_key) < 3 AND ? LIKE '%' || name_key || '%')"]
+    conditions += ["name_key LIKE ?"] * len(bigrams)
+    return _query(
+        f"SELECT name, name_key FROM products WHERE {' OR '.join(conditions)} LIMIT ?",
+        (key, *('%' + b + '%' for b in bigrams), limit),
+    )
+
+
+def find_product_candidates(query, limit=5):
+    """이름이 비슷한 상품 후보를 [(이름, 유사도 0~1), ...] 형태로 유사도 순으로 반환합니다."""
+    key = normalize_name(query)
+    _get_connection()
+    if not key or not _has_name_key:
+        return []
+    scored = [
+        (name, difflib.SequenceMatcher(None, key, name_key).ratio())
+        for name, name_key in _candidate_rows(key, limit * 10)
+    ]
+    scored.sort(key=lambda item: item[1], reverse=True)
+    return scored[:limit]
+
+
+@lru_cache(maxsize=1024)
+def resolve_product_name(query):
+    """
+    사용자가 입력한 상품 이름을 DB의 정식 이름으로 바꿉니다.
+    정확히 일치 -> 정규화 이름 일치 -> 유사도가 MATCH_THRESHOLD 이상인 최상위 후보 순으로 시도하며,
+    찾지 못하면 None을 반환합니다.
+    """
+    if get_product_description(query) is not None:
+        return query
+    key = normalize_name(query)
+    _get_connection()
+    if key and _has_name_key:
+        rows = _query("SELECT name FROM products WHERE name_key = ? LIMIT 1", (key,))
+        if rows:
+            return rows[0][0]
+    candidates = find_product_candidates(query)
+    if candidates and candidates[0][1] >= MATCH_THRESHOLD:
+        return candidates[0][0]
+    return None
+
+
+def search_products(text, limit=5):
+    """상품 설명에서 문구를 검색하여 관련도(설명 일치) 순으로 상품 이름 목록을 반환합니다. (이름 검색은 find_product_candidates)"""
+    text = text.strip()
+    _get_connection()
+    if len(text) < 3 or not _has_fts:
+        return []
+    match = 'description : "' + text.replace('"', '""') + '"'
+    rows = _query(
+        "SELECT name FROM products_fts WHERE products_fts MATCH ? ORDER BY bm25(products_fts) LIMIT ?",
+        (match, limit),
+    )
+    return [row[0] for row in rows]
+
+
+# --- 4. 일괄 upsert ---
+def iter_products_file(path):
+    """CSV(name, description 열) 또는 JSONL({"name", "description"}) 파일에서 (이름, 설명) 쌍을 하나씩 읽습니다."""
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        if path.lower().endswith((".jsonl", ".json")):
+            for line in f:
+                if line.strip():
+                    item = json.loads(line)
+                    yield item["name"], item["description"]
+        else:
+            for row in csv.DictReader(f):
+                yield row["name"], row["description"]
+
+
+def upsert_products(conn, products, batch_size=_UPSERT_BATCH_SIZE):
+    """
+    (이름, 설명) 쌍들을 batch_size 단위로 products 테이블과 검색 인덱스에 upsert합니다.
+    이미 있는 이름은 설명을 갱신합니다. 반영된 상품 수를 반환합니다.
+    """
+    total = 0
+    batch = []
+
+    def flush():
+        conn.executemany(
+            "INSERT INTO products (name, description, name_key) VALUES (?, ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET description = excluded.description, name_key = excluded.name_key",
+            [(name, description, normalize_name(name)) for name, description in batch],
+        )
+        names = [(name,) for name, _ in batch]
+        conn.executemany("DELETE FROM products_fts WHERE rowid = (SELECT id FROM products WHERE name = ?)", names)
+        conn.executemany(
+            "INSERT INTO products_fts (rowid, name, name_key, description) "
+            "SELECT id, name, name_key, description FROM products WHERE name = ?",
+            names,
+        )
+
+    with conn:
+        for name, description in products:
+            batch.append((name.strip(), description.strip()))
+            if len(batch) >= batch_size:
+                flush()
+                total += len(batch)
+                batch = []
+        if batch:
+            flush()
+            total += len(batch)
+
+    # 갱신된 설명이 반영되도록 캐시 초기화
+    get_product_description.cache_clear()
+    resolve_product_name.cache_clear()
+    return total
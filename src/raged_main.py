@@ -3,27 +3,25 @@ import os
 import io
 import re
 from dotenv import load_dotenv
-import pickle
 import time
-from google import genai
 from google.genai import types
 from datetime import datetime # datetime 모듈 추가
 # --- Gemini 및 LangChain 모듈 ---
-from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.storage import InMemoryStore
+from langchain.storage import LocalFileStore, create_kv_docstore
 from langchain.retrievers import ParentDocumentRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 # --- 기존 유틸리티 모듈 ---
 from gtts import gTTS
 from PIL import Image
+from narration import generate_narration, split_scenes
+from hedging import HedgePolicy
+from client_pool import ClientPool, PooledEmbeddings
 import argparse  # argparse 모듈 추가
 
-# .env 로드 및 API 키 설정
+# .env 로드 및 API 키 풀 설정 (GEMINI_API_KEYS 또는 GEMINI_API_KEY)
 load_dotenv()
-api_key = os.getenv("GEMINI_API_KEY")
-if not api_key or api_key == "YOUR_API_KEY_HERE":
-    raise ValueError("GEMINI_API_KEY가 .env 파일에 설정되지 않았거나 유효하지 않습니다.")
+client_pool = ClientPool.from_env()
 
 # --- 1. 고급 RAG 검색기(Retriever) 로드 및 실행 ---
 def get_context_with_parent_retriever(user_question: str) -> str:
@@ -34,7 +32,7 @@ def get_context_with_parent_retriever(user_question: str) -> str:
     print(f"\n'{user_question}'에 대한 참고 자료 검색 중... (Parent Document Retriever)")
     try:
         # DB 구축 시 사용했던 설정과 동일하게 로드
-        embeddings = GoogleGenerativeAIEmbeddings(model="models/text-embedding-004", google_api_key=api_key)
+        embeddings = PooledEmbeddings(client_pool, model="models/text-embedding-004")
         
         # 1. 벡터 저장소(자식 조각) 로드
         vectorstore = Chroma(
@@ -44,8 +42,10 @@ def get_context_with_parent_retriever(user_question: str) -> str:
         )
         
         # 2. 문서 저장소(부모 조각) 로드
-        with open("db/docstore/docstore.pkl", "rb") as f:
-            store = pickle.load(f)
+        # (부모 조각은 키마다 파일 하나로 저장되어 있으며, 검색된 것만 읽어 옴)
+        if not os.path.isdir("db/docstore"):
+            raise FileNotFoundError("db/docstore 폴더가 없습니다")
+        store = create_kv_docstore(LocalFileStore("db/docstore"))
 
         child_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
 
@@ -112,8 +112,12 @@ def parse_storyline(storyline_text):
         print(f"오류: 스토리라인 파싱 중 오류 발생: {e}")
         return None, storyline_text
     
-def generate_illustrations(client, scenes_text, character_description, output_dir):
-    """표지 이미지를 생성하고, 이를 참조하여 각 장면의 일러스트를 생성합니다."""
+def _has_image(response):
+    """이미지 생성 응답에 이미지 데이터가 들어 있는지 확인합니다. (헤지 요청의 성공 판정)"""
+    return bool(response.candidates) and any(part.inline_data for part in response.candidates[0].content.parts)
+
+def generate_illustrations(client, scenes_text, character_description, output_dir, hedge=None):
+    """표지 이미지를 생성하고, 이를 참조하여 각 장면의 일러스트를 생성합니다. (hedge: 표지/장면 이미지 요청에 적용할 HedgePolicy)"""
     print("\n일러스트 생성 중... (Gemini Image Preview API 호출)")
 
     if not character_description:
@@ -132,11 +136,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
     for attempt in range(3):
         try:
             generate_content_config = types.GenerateContentConfig(response_modalities=["IMAGE"])
-            response = client.models.generate_content(
+            request = lambda: client.models.generate_content(
                 model="gemini-2.5-flash-image-preview",
                 contents=[cover_prompt],
                 config=generate_content_config,
             )
+            response = hedge.call(request, accept=_has_image) if hedge else request()
             if response.candidates:
                 for part in response.candidates[0].content.parts:
                     if part.inline_data:
@@ -159,15 +164,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
         return
 
     # 2. 장면별 일러스트 생성
-    scenes = [s.strip() for s in scenes_text.strip().split('장면') if s and ':' in s]
+    scenes = split_scenes(scenes_text)
 
-    for i, scene_text in enumerate(scenes):
+    for i, clean_text in enumerate(scenes):
         scene_number = i + 1
         print(f"  - 장면 {scene_number} 이미지 생성 중...")
 
-        clean_text = scene_text.split(":", 1)[1].strip() if ":" in scene_text else scene_text
-        clean_text = clean_text.replace('**', '')
-
         scene_prompt = f"""
         Reference the characters and art style from the provided cover image.
         
@@ -183,11 +185,12 @@ def generate_illustrations(client, scenes_text, character_description, output_di
         for attempt in range(3):
             try:
                 generate_content_config = types.GenerateContentConfig(response_modalities=["IMAGE"])
-                response = client.models.generate_content(
+                request = lambda: client.models.generate_content(
                     model="gemini-2.5-flash-image-preview",
                     contents=contents_for_api,
                     config=generate_content_config,
                 )
+                response = hedge.call(request, accept=_has_image) if hedge else request()
                 if response.candidates:
                     for part in response.candidates[0].content.parts:
                         if part.inline_data:
@@ -206,24 +209,25 @@ def generate_illustrations(client, scenes_text, character_description, output_di
 
         if not image_generated:
             print(f"  - 장면 {scene_number} 이미지 생성에 최종적으로 실패했습니다.")
-            with open(f"output/scene_{scene_number}_error.txt", "w", encoding="utf-8") as f:
+            with open(os.path.join(output_dir, f"scene_{scene_number}_error.txt"), "w", encoding="utf-8") as f:
                 f.write("최대 재시도 횟수 초과")
 
+    if hedge:
+        hedge.report()
+
     print("\n'output' 폴더에 일러스트 파일 생성이 완료되었습니다.")
 
 def generate_voice_and_subtitles(scenes_text, output_dir):
     """gTTS를 사용하여 음성 파일을 생성하고, 자막 파일을 만듭니다."""
     print("\n음성 및 자막 생성 중...")
     
-    scenes = [s.strip() for s in scenes_text.strip().split('장면') if s and ':' in s]
+    scenes = split_scenes(scenes_text)
     if not scenes:
         print("  - 스토리라인에서 장면을 추출할 수 없습니다.")
         return
 
-    for i, scene_text in enumerate(scenes):
+    for i, clean_text in enumerate(scenes):
         scene_number = i + 1
-        clean_text = scene_text.split(":", 1)[1].strip() if ":" in scene_text else scene_text
-        clean_text = clean_text.replace('**', '')
 
         print(f"  - 장면 {scene_number} 음성/자막 생성 중...")
 
@@ -232,7 +236,7 @@ def generate_voice_and_subtitles(scenes_text, output_dir):
             tts.save(os.path.join(output_dir, f"scene_{scene_number}_audio.mp3"))
         except Exception as e:
             print(f"  - 장면 {scene_number} 음성 생성 중 오류 발생: {e}")
-            with open(f"output/scene_{scene_number}_audio_placeholder.txt", "w", encoding="utf-8") as f:
+            with open(os.path.join(output_dir, f"scene_{scene_number}_audio_placeholder.txt"), "w", encoding="utf-8") as f:
                 f.write(f"음성 생성 오류: {clean_text}")
 
         with open(os.path.join(output_dir, f"scene_{scene_number}_subtitle.txt"), "w", encoding="utf-8") as f:
@@ -244,9 +248,14 @@ def generate_voice_and_subtitles(scenes_text, output_dir):
 def main():
     parser = argparse.ArgumentParser(description="RAG를 사용하여 질문에 대한 동화를 생성합니다.")
     parser.add_argument("--question", type=str, required=True, help="동화로 만들고 싶은 질문")
+    parser.add_argument("--narration", action="store_true", help="장면 음성을 동시에 합성하여 단일 오디오와 WebVTT 자막으로 생성")
+    parser.add_argument("--hedge", action="store_true", help="느린 이미지 요청에 중복(헤지) 요청을 보내 꼬리 지연을 줄임")
+    parser.add_argument("--hedge-percentile", type=float, default=95, help="헤지 요청을 보낼 지연 시간 백분위수")
+    parser.add_argument("--hedge-budget", type=float, default=0.2, help="전체 요청 대비 헤지 요청의 최대 비율")
     args = parser.parse_args()
 
-    client = genai.Client(api_key=api_key)
+    # 텍스트/이미지 요청을 부하가 가장 적은 키로 분산 (genai.Client와 같은 방식으로 호출)
+    client = client_pool
 
     user_question = args.question # 하드코딩된 값을 인자로 대체
     
@@ -284,9 +293,15 @@ def main():
 
     character_description, scenes_text = parse_storyline(full_storyline_text)
 
-    generate_illustrations(client, scenes_text, character_description, output_dir)
+    hedge = HedgePolicy(percentile=args.hedge_percentile, budget=args.hedge_budget) if args.hedge else None
+    generate_illustrations(client, scenes_text, character_description, output_dir, hedge=hedge)
+    if hedge:
+        hedge.close()  # 관측한 지연 시간을 다음 실행을 위해 저장
     
-    generate_voice_and_subtitles(scenes_text, output_dir)
+    if args.narration:
+        generate_narration(scenes_text, output_dir)
+    else:
+        generate_voice_and_subtitles(scenes_text, output_dir)
 
     print("\n--- 모든 프로세스 완료 ---")
     print("'output' 폴더에서 결과물을 확인하세요.")
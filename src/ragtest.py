@@ -4,13 +4,12 @@ import os
 import io
 import re
 from dotenv import load_dotenv
-import pickle
 
 # --- Gemini 및 LangChain 모듈 ---
 import google.generativeai as genai
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_community.vectorstores import Chroma
-from langchain.storage import InMemoryStore
+from langchain.storage import LocalFileStore, create_kv_docstore
 from langchain.retrievers import ParentDocumentRetriever
 from langchain.text_splitter import RecursiveCharacterTextSplitter # <- 이 부분을 추가합니다.
 
@@ -38,8 +37,10 @@ def get_context_with_parent_retriever(user_question: str) -> str:
         )
         
         # 2. 문서 저장소(부모 조각) 로드
-        with open("db/docstore/docstore.pkl", "rb") as f:
-            store = pickle.load(f)
+        # (부모 조각은 키마다 파일 하나로 저장되어 있으며, 검색된 것만 읽어 옴)
+        if not os.path.isdir("db/docstore"):
+            raise FileNotFoundError("db/docstore 폴더가 없습니다")
+        store = create_kv_docstore(LocalFileStore("db/docstore"))
 
         child_splitter = RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50)
 
@@ -0,0 +1,304 @@
+# storage_manager.py
+# -*- coding: utf-8 -*-
+"""
+output 폴더의 보관 정책을 적용합니다.
+
+1. output 루트에 남은 장면 오류/음성 대체 파일(scene_N_error.txt 등)을 삭제합니다.
+2. 생성에 실패했거나 중간에 끊긴 이야기 폴더를 삭제합니다. (생성 중일 수 있는 최근 폴더는 제외)
+3. 보관 기간, 보관 개수, 전체 용량 한도를 넘는 오래된 이야기부터 삭제합니다.
+4. (선택) 남은 PNG를 무손실로 다시 압축합니다.
+5. (선택) 이야기 사이에 내용이 같은 파일을 하드링크로 합쳐 중복 저장을 없앱니다.
+
+사용 예:
+    python storage_manager.py --max-age-days 30 --max-stories 500 --max-bytes 5G --compact-png --dedupe
+    python storage_manager.py --max-stories 100 --dry-run
+"""
+import os
+import re
+import time
+import shutil
+import hashlib
+import argparse
+import threading
+from datetime import datetime
+
+OUTPUT_FOLDER = "output"
+STORY_PATTERN = re.compile(r"^story_(\d{8}_\d{6})$")
+# 생성 스크립트가 과거에 output 루트에 남기던 파일
+STRAY_FILE_PATTERN = re.compile(r"^scene_\d+_(error|audio_placeholder)\.txt$")
+# 이 시간(초)보다 최근에 만들어진 이야기는 생성 중일 수 있으므로 미완성 판정에서 제외
+PARTIAL_GRACE_SECONDS = 3600
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+_SIZE_UNITS = {"K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+
+
+def parse_size(text):
+    """'500M', '5G' 같은 용량 문자열을 바이트 수로 변환합니다."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in _SIZE_UNITS:
+        return int(float(text[:-1]) * _SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def _story_time(story_dir):
+    """폴더 이름의 타임스탬프(story_YYYYmmdd_HHMMSS)로 생성 시각을 구합니다. 없으면 수정 시각을 사용합니다."""
+    match = STORY_PATTERN.match(os.path.basename(story_dir))
+    if match:
+        return datetime.strptime(match.group(1), "%Y%m%d_%H%M%S").timestamp()
+    return os.path.getmtime(story_dir)
+
+
+def _dir_size(path):
+    """폴더 안 파일들의 전체 크기를 구합니다. (하드링크된 파일은 한 번만 계산)"""
+    total, seen = 0, set()
+    for root, _, files in os.walk(path):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            if (stat.st_dev, stat.st_ino) not in seen:
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def _story_inodes(path):
+    """폴더 안 파일들의 {(st_dev, st_ino): 크기}를 구합니다."""
+    inodes = {}
+    for root, _, files in os.walk(path):
+        for name in files:
+            stat = os.stat(os.path.join(root, name))
+            inodes[(stat.st_dev, stat.st_ino)] = stat.st_size
+    return inodes
+
+
+def list_story_dirs(output_folder=OUTPUT_FOLDER):
+    """output 폴더의 이야기 폴더들을 오래된 순으로 반환합니다."""
+    try:
+        entries = [os.path.join(output_folder, d) for d in os.listdir(output_folder)]
+    except FileNotFoundError:
+        return []
+    return sorted((p for p in entries if os.path.isdir(p)), key=_story_time)
+
+
+def is_partial_story(story_dir):
+    """
+    생성에 실패했거나 중간에 끊긴 이야기인지 판정합니다.
+    스토리라인이 없거나, 장면 이미지가 하나도 없거나, 음성이 전혀 없으면 미완성입니다.
+    일부 장면만 실패한 이야기(scene_N_error.txt 등)는 나머지 결과물이 있으므로 보관합니다.
+    """
+    files = os.listdir(story_dir)
+    if "storyline.txt" not in files:
+        return True
+    if not any(f.startswith("scene_") and f.endswith("_image.png") for f in files):
+        return True
+    return not any(f.endswith("_audio.mp3") for f in files)
+
+
+def _remove_story(story_dir, reason, dry_run, summary, size=None):
+    """이야기 폴더를 삭제합니다. size는 실제로 확보되는 용량이며, 생략하면 폴더 크기를 사용합니다."""
+    if size is None:
+        size = _dir_size(story_dir)
+    print(f"  - 삭제{' (dry-run)' if dry_run else ''}: {os.path.basename(story_dir)} ({reason}, {size:,} bytes)")
+    if not dry_run:
+        shutil.rmtree(story_dir, ignore_errors=True)
+    summary["removed_stories"] += 1
+    summary["freed_bytes"] += size
+
+
+def compact_pngs(story_dirs, dry_run=False):
+    """PNG를 무손실로 다시 압축하여 더 작아진 경우에만 교체합니다. 줄어든 바이트 수를 반환합니다."""
+    from PIL import Image
+
+    saved = 0
+    for story_dir in story_dirs:
+        for name in os.listdir(story_dir):
+            path = os.path.join(story_dir, name)
+            # 하드링크로 공유 중인 파일은 다른 이야기에도 영향을 주므로 건너뜀
+            if not name.lower().endswith(".png") or os.stat(path).st_nlink > 1:
+                continue
+            # 프로세스별 임시 파일 이름 (여러 프로세스가 동시에 정리해도 충돌하지 않음)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                with Image.open(path) as img:
+                    img.save(tmp_path, format="PNG", optimize=True)
+                before, after = os.path.getsize(path), os.path.getsize(tmp_path)
+                if after < before and not dry_run:
+                    os.replace(tmp_path, path)
+                if after < before:
+                    saved += before - after
+            except Exception as e:
+                print(f"  - '{path}' 압축 중 오류 발생, 건너뜁니다: {e}")
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+    return saved
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def dedupe_assets(story_dirs, dry_run=False):
+    """내용이 같은 파일을 하드링크로 합칩니다. 크기가 같은 파일만 해시를 계산합니다. 줄어든 바이트 수를 반환합니다."""
+    by_size = {}
+    for story_dir in story_dirs:
+        for name in os.listdir(story_dir):
+            path = os.path.join(story_dir, name)
+            if os.path.isfile(path) and not os.path.islink(path):
+                by_size.setdefault(os.path.getsize(path), []).append(path)
+
+    saved = 0
+    for size, paths in by_size.items():
+        if size == 0 or len(paths) < 2:
+            continue
+        by_hash = {}
+        for path in paths:
+            by_hash.setdefault(_file_hash(path), []).append(path)
+        for same in by_hash.values():
+            original = same[0]
+            original_stat = os.stat(original)
+            for path in same[1:]:
+                stat = os.stat(path)
+                if (stat.st_dev, stat.st_ino) == (original_stat.st_dev, original_stat.st_ino):
+                    continue
+                if stat.st_dev != original_stat.st_dev:
+                    continue  # 다른 파일 시스템 사이에는 하드링크 불가
+                if not dry_run:
+                    # 임시 링크를 만든 뒤 교체하여, 중간에 실패해도 원본이 사라지지 않게 함
+                    tmp_path = f"{path}.{os.getpid()}.link"
+                    try:
+                        os.link(original, tmp_path)
+                        os.replace(tmp_path, path)
+                    except OSError as e:
+                        print(f"  - '{path}' 하드링크 중 오류 발생, 건너뜁니다: {e}")
+                        if os.path.exists(tmp_path):
+                            os.remove(tmp_path)
+                        continue
+                # 마지막 링크가 교체될 때만 실제 공간이 확보됨
+                if stat.st_nlink == 1:
+                    saved += size
+    return saved
+
+
+def enforce_policy(output_folder=OUTPUT_FOLDER, max_age_days=None, max_stories=None, max_bytes=None,
+                   remove_partial=True, compact_png=False, dedupe=False, dry_run=False):
+    """output 폴더에 보관 정책을 적용하고 결과 요약 dict를 반환합니다."""
+    summary = {"removed_stories": 0, "removed_stray_files": 0, "freed_bytes": 0,
+               "compacted_bytes": 0, "deduped_bytes": 0}
+    now = time.time()
+
+    # 1. output 루트의 장면 오류/음성 대체 파일 정리
+    if os.path.isdir(output_folder):
+        for name in os.listdir(output_folder):
+            path = os.path.join(output_folder, name)
+            if STRAY_FILE_PATTERN.match(name) and os.path.isfile(path):
+                summary["freed_bytes"] += os.path.getsize(path)
+                summary["removed_stray_files"] += 1
+                if not dry_run:
+                    os.remove(path)
+
+    stories = list_story_dirs(output_folder)
+
+    # 2. 실패/미완성 이야기 삭제
+    if remove_partial:
+        kept = []
+        for story_dir in stories:
+            if now - _story_time(story_dir) > PARTIAL_GRACE_SECONDS and is_partial_story(story_dir):
+                _remove_story(story_dir, "미완성", dry_run, summary)
+            else:
+                kept.append(story_dir)
+        stories = kept
+
+    # 3. 보관 기간 -> 보관 개수 -> 전체 용량 순으로 오래된 이야기부터 삭제
+    if max_age_days is not None:
+        cutoff = now - max_age_days * 86400
+        expired = [s for s in stories if _story_time(s) < cutoff]
+        for story_dir in expired:
+            _remove_story(story_dir, f"{max_age_days}일 초과", dry_run, summary)
+        stories = stories[len(expired):]
+
+    if max_stories is not None and len(stories) > max_stories:
+        excess = len(stories) - max_stories
+        for story_dir in stories[:excess]:
+            _remove_story(story_dir, f"최대 {max_stories}개 초과", dry_run, summary)
+        stories = stories[excess:]
+
+    if max_bytes is not None:
+        # 하드링크로 여러 이야기가 공유하는 파일은 전체에서 한 번만 계산하고,
+        # 마지막으로 참조하던 이야기가 삭제될 때에만 그 크기만큼 용량이 줄어든 것으로 봄
+        story_inodes = [_story_inodes(s) for s in stories]
+        owners, inode_sizes = {}, {}
+        for index, inodes in enumerate(story_inodes):
+            for inode, size in inodes.items():
+                owners.setdefault(inode, set()).add(index)
+                inode_sizes[inode] = size
+        total = sum(inode_sizes.values())
+        index = 0
+        while index < len(stories) and total > max_bytes:
+            freed = 0
+            for inode in story_inodes[index]:
+                owners[inode].discard(index)
+                if not owners[inode]:
+                    freed += inode_sizes[inode]
+            _remove_story(stories[index], f"전체 용량 {max_bytes:,} bytes 초과", dry_run, summary, size=freed)
+            total -= freed
+            index += 1
+        stories = stories[index:]
+
+    # 4~5. 남은 이야기의 PNG 압축 및 중복 파일 하드링크 (압축이 파일 내용을 바꾸므로 먼저 수행)
+    if compact_png:
+        summary["compacted_bytes"] = compact_pngs(stories, dry_run)
+    if dedupe:
+        summary["deduped_bytes"] = dedupe_assets(stories, dry_run)
+
+    return summary
+
+
+def start_background_cleanup(interval_seconds, output_folder=OUTPUT_FOLDER, **policy):
+    """interval_seconds마다 보관 정책을 적용하는 데몬 스레드를 시작합니다."""
+    def run():
+        while True:
+            try:
+                summary = enforce_policy(output_folder, **policy)
+                if summary["removed_stories"] or summary["removed_stray_files"]:
+                    print(f"[storage] 정리 완료: {summary}")
+            except Exception as e:
+                print(f"[storage] 정리 중 오류 발생: {e}")
+            time.sleep(interval_seconds)
+
+    thread = threading.Thread(target=run, name="storage-cleanup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description="output 폴더에 보관 기간/개수/용량 정책을 적용합니다.")
+    parser.add_argument("--output", type=str, default=OUTPUT_FOLDER, help="정리할 output 폴더")
+    parser.add_argument("--max-age-days", type=float, default=None, help="이 기간(일)보다 오래된 이야기 삭제")
+    parser.add_argument("--max-stories", type=int, default=None, help="최신 이야기를 이 개수만큼만 보관")
+    parser.add_argument("--max-bytes", type=parse_size, default=None, help="전체 용량 한도 (예: 500M, 5G)")
+    parser.add_argument("--keep-partial", action="store_true", help="실패/미완성 이야기를 삭제하지 않음")
+    parser.add_argument("--compact-png", action="store_true", help="PNG를 무손실로 다시 압축")
+    parser.add_argument("--dedupe", action="store_true", help="이야기 사이의 동일한 파일을 하드링크로 합침")
+    parser.add_argument("--dry-run", action="store_true", help="실제로 삭제/변경하지 않고 결과만 출력")
+    args = parser.parse_args()
+
+    print(f"'{args.output}' 폴더 정리 중...{' (dry-run)' if args.dry_run else ''}")
+    summary = enforce_policy(
+        args.output, max_age_days=args.max_age_days, max_stories=args.max_stories, max_bytes=args.max_bytes,
+        remove_partial=not args.keep_partial, compact_png=args.compact_png, dedupe=args.dedupe, dry_run=args.dry_run,
+    )
+    print(f"\n삭제한 이야기: {summary['removed_stories']}개, 삭제한 루트 오류 파일: {summary['removed_stray_files']}개")
+    print(f"삭제로 확보한 용량: {summary['freed_bytes']:,} bytes")
+    if args.compact_png:
+        print(f"PNG 압축으로 줄인 용량: {summary['compacted_bytes']:,} bytes")
+    if args.dedupe:
+        print(f"중복 제거로 줄인 용량: {summary['deduped_bytes']:,} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+# story_export.py
+# -*- coding: utf-8 -*-
+"""
+이야기 폴더를 zip/tar 아카이브로 즉석에서 스트리밍합니다.
+
+임시 파일 없이 파일을 CHUNK_SIZE 단위로 읽어 아카이브 바이트를 바로 내보내므로,
+이야기 수나 크기와 관계없이 메모리 사용량이 일정합니다.
+이미 압축된 PNG/MP3는 다시 압축하지 않고 그대로 저장(ZIP_STORED)합니다.
+"""
+import os
+import time
+import tarfile
+import zipfile
+
+CHUNK_SIZE = 64 * 1024
+# 이미 압축된 형식: deflate해도 크기가 거의 줄지 않으므로 그대로 저장
+STORED_EXTENSIONS = {".png", ".mp3", ".jpg", ".jpeg", ".webp"}
+ARCHIVE_FORMATS = {
+    "zip": ("application/zip", ".zip"),
+    "tar": ("application/x-tar", ".tar"),
+}
+
+
+def iter_story_files(output_folder, story_ids):
+    """(아카이브 내 경로, 실제 파일 경로) 쌍을 이야기 순서대로 하나씩 반환합니다."""
+    for story_id in story_ids:
+        story_dir = os.path.join(output_folder, story_id)
+        for root, dirs, files in os.walk(story_dir):
+            dirs.sort()
+            for name in sorted(files):
+                path = os.path.join(root, name)
+                arcname = os.path.relpath(path, output_folder).replace(os.sep, "/")
+                yield arcname, path
+
+
+class _StreamBuffer:
+    """ZipFile이 쓰는 바이트를 모아 두었다가 drain()으로 꺼내는 쓰기 전용(탐색 불가) 버퍼."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _read_chunks(path, limit=None):
+    """파일을 CHUNK_SIZE 단위로 읽습니다. limit이 주어지면 그 바이트 수까지만 읽습니다."""
+    remaining = limit
+    with open(path, "rb") as f:
+        while remaining is None or remaining > 0:
+            chunk = f.read(CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def _drain(buffer):
+    # 빈 청크는 chunked 전송의 종료로 해석될 수 있으므로 내보내지 않음
+    data = buffer.drain()
+    if data:
+        yield data
+
+
+def iter_zip(entries):
+    """(아카이브 내 경로, 파일 경로) 목록을 zip 바이트 스트림으로 변환합니다."""
+    buffer = _StreamBuffer()
+    # 탐색 불가능한 스트림이므로 ZipFile이 각 항목 뒤에 data descriptor를 기록
+    with zipfile.ZipFile(buffer, mode="w", allowZip64=True) as zf:
+        for arcname, path in entries:
+            stat = os.stat(path)
+            info = zipfile.ZipInfo(arcname, date_time=time.localtime(stat.st_mtime)[:6])
+            if os.path.splitext(path)[1].lower() in STORED_EXTENSIONS:
+                info.compress_type = zipfile.ZIP_STORED
+            else:
+                info.compress_type = zipfile.ZIP_DEFLATED
+            info.file_size = stat.st_size
+            with zf.open(info, mode="w", force_zip64=stat.st_size >= zipfile.ZIP64_LIMIT) as dest:
+                for chunk in _read_chunks(path):
+                    dest.write(chunk)
+                    yield from _drain(buffer)
+            yield from _drain(buffer)
+    # 중앙 디렉터리(central directory)는 ZipFile을 닫을 때 기록됨
+    yield from _drain(buffer)
+
+
+def iter_tar(entries):
+    """(아카이브 내 경로, 파일 경로) 목록을 tar 바이트 스트림으로 변환합니다."""
+    for arcname, path in entries:
+        stat = os.stat(path)
+        info = tarfile.TarInfo(arcname)
+        info.size = stat.st_size
+        info.mtime = int(stat.st_mtime)
+        info.mode = 0o644
+        yield info.tobuf(format=tarfile.PAX_FORMAT, encoding="utf-8", errors="surrogateescape")
+        written = 0
+        # 헤더에 기록한 크기만큼만 읽어야 파일이 도중에 커져도 아카이브가 깨지지 않음
+        for chunk in _read_chunks(path, limit=info.size):
+            written += len(chunk)
+            yield chunk
+        if written != info.size:
+            raise OSError(f"'{path}' 파일이 내보내는 중에 줄어들었습니다.")
+        remainder = info.size % tarfile.BLOCKSIZE
+        if remainder:
+            yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+    # 아카이브 끝 표시: 빈 블록 2개
+    yield tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+
+
+def iter_archive(output_folder, story_ids, archive_format="zip"):
+    """이야기 폴더들을 지정한 형식(zip/tar)의 아카이브 바이트 스트림으로 반환합니다."""
+    entries = iter_story_files(output_folder, story_ids)
+    if archive_format == "tar":
+        return iter_tar(entries)
+    return iter_zip(entries)